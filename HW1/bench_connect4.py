@@ -0,0 +1,35 @@
+import argparse
+import random
+import time
+from connect4 import Connect4, BitboardConnect4
+
+
+def play_games(engine, games, seed):
+    rng = random.Random(seed)
+    moves = 0
+    t0 = time.perf_counter()
+    for _ in range(games):
+        g = engine()
+        while g.winner is None:
+            col = rng.randrange(7)
+            try:
+                g.drop(col)
+                moves += 1
+            except ValueError:
+                pass
+    return moves / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--games', type=int, default=5000)
+    args = ap.parse_args()
+
+    before = play_games(Connect4, args.games, 1)
+    after = play_games(BitboardConnect4, args.games, 1)
+    print(f"[bench] validated drops/s over {args.games} random games")
+    print(f"  Connect4 (lists)  : {before:10.0f}")
+    print(f"  BitboardConnect4  : {after:10.0f}  ({after / before:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import lobby_server as ls
+
+
+legacy_lock = threading.Lock()
+
+
+def legacy_report(u):
+    with legacy_lock:
+        sh = ls.shard_for(u)
+        ls.ensure_user_stats(sh, u)
+        sh.stats[u]['wins'] += 1
+        users, stats = ls.snapshot()
+        with open(ls.USERS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(users, f)
+        with open(ls.STATS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(stats, f)
+
+
+def journal_report(u):
+    session = {}
+    ls.process_message({"type": "REPORT", "username": u, "delta": {"wins": 1}}, session)
+    ls.journal.wait(session.pop('commit', 0))
+
+
+def run(fn, n_threads, n_ops):
+    def worker(i):
+        for j in range(n_ops):
+            fn(f"user_{(i * n_ops + j) % 1000}")
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return n_threads * n_ops / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    ap.add_argument('--threads', type=int, default=16)
+    ap.add_argument('--ops', type=int, default=20)
+    args = ap.parse_args()
+
+    print(f"[bench] REPORT ops/s, {args.threads} threads x {args.ops} ops")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            seed_users = {f"user_{i}": "pw" for i in range(size)}
+            seed_stats = {u: {"wins": 0, "loses": 0, "logins": 0} for u in seed_users}
+            with open(ls.USERS_FILE, 'w', encoding='utf-8') as f:
+                json.dump(seed_users, f)
+            with open(ls.STATS_FILE, 'w', encoding='utf-8') as f:
+                json.dump(seed_stats, f)
+            ls.init_shards(1)
+            ls.load_persist()
+            before = run(legacy_report, args.threads, args.ops)
+            after = run(journal_report, args.threads, args.ops)
+            ls.journal.close()
+            os.chdir('/')
+        print(f"  users={size:7d}  full rewrite={before:9.0f}  journal={after:9.0f}")
+
+if __name__ == '__main__':
+    main()
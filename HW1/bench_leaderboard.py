@@ -0,0 +1,42 @@
+import argparse
+import random
+import time
+from leaderboard import Leaderboard
+
+
+def timed(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 300000])
+    ap.add_argument('--ops', type=int, default=20000)
+    args = ap.parse_args()
+
+    rng = random.Random(1)
+    print("[bench] leaderboard, microseconds per operation")
+    for size in args.sizes:
+        stats = {f"user_{i}": {"wins": rng.randrange(200), "loses": rng.randrange(200)}
+                 for i in range(size)}
+        lb = Leaderboard()
+        t0 = time.perf_counter()
+        lb.rebuild(stats)
+        build = time.perf_counter() - t0
+        names = list(stats)
+
+        def report(i):
+            u = names[rng.randrange(size)]
+            stats[u]['wins'] += 1
+            lb.update(u, stats[u])
+
+        upd = timed(report, args.ops)
+        rank = timed(lambda i: lb.rank(names[rng.randrange(size)]), args.ops)
+        top = timed(lambda i: lb.top(10), args.ops)
+        print(f"  users={size:7d} rebuild={build:6.2f}s  REPORT={upd:6.1f}  RANK={rank:6.1f}  TOP10={top:6.1f}")
+
+if __name__ == '__main__':
+    main()
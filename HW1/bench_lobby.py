@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from common import ENC, JsonLineSocket
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX = "REGISTER=1,LOGIN=2,REPORT=10,LOGOUT=1"
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def start_lobby(mode, port, workdir, extra=()):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, 'lobby_server.py'),
+         '--host', '127.0.0.1', '--port', str(port), '--mode', mode, *extra],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f'lobby ({mode}) did not start on {port}')
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def read_rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip().upper()] = float(weight or 1)
+    return list(mix), list(mix.values())
+
+
+def make_request(op, username):
+    if op in ('REGISTER', 'LOGIN'):
+        return {"type": op, "username": username, "password": "load"}
+    if op == 'REPORT':
+        return {"type": op, "username": username, "delta": {"wins": 1}}
+    return {"type": op, "username": username}
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.errors = {}
+        self.rejected = {}
+
+    def record(self, op, seconds, resp):
+        with self.lock:
+            if resp is None or str(resp.get('msg', '')).startswith('SERVER_ERROR'):
+                self.errors[op] = self.errors.get(op, 0) + 1
+                return
+            self.latency.setdefault(op, []).append(seconds)
+            if not resp.get('ok'):
+                self.rejected[op] = self.rejected.get(op, 0) + 1
+
+
+def thread_client(i, args, ops, weights, stop_at, rec):
+    rng = random.Random(i)
+    username = f"load_{i}"
+    js = None
+    done = 0
+    while time.time() < stop_at and (not args.ops or done < args.ops):
+        op = rng.choices(ops, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            if js is None:
+                js = JsonLineSocket(socket.create_connection((args.host, args.port), timeout=args.timeout))
+            js.send(make_request(op, username))
+            resp = js.recv()
+        except Exception:
+            resp = None
+        rec.record(op, time.perf_counter() - t0, resp)
+        if resp is None or op == 'LOGOUT':
+            if js is not None:
+                js.sock.close()
+            js = None
+        done += 1
+    if js is not None:
+        js.sock.close()
+
+
+async def async_client(i, args, ops, weights, stop_at, rec):
+    rng = random.Random(i)
+    username = f"load_{i}"
+    conn = None
+    done = 0
+    while time.time() < stop_at and (not args.ops or done < args.ops):
+        op = rng.choices(ops, weights)[0]
+        t0 = time.perf_counter()
+        resp = None
+        try:
+            if conn is None:
+                conn = await asyncio.wait_for(asyncio.open_connection(args.host, args.port), args.timeout)
+            reader, writer = conn
+            writer.write(json.dumps(make_request(op, username), separators=(",", ":")).encode(ENC) + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), args.timeout)
+            if line:
+                resp = json.loads(line.decode(ENC))
+        except Exception:
+            resp = None
+        rec.record(op, time.perf_counter() - t0, resp)
+        if resp is None or op == 'LOGOUT':
+            if conn is not None:
+                conn[1].close()
+            conn = None
+        done += 1
+    if conn is not None:
+        conn[1].close()
+
+
+def drive(args, ops, weights, rec):
+    stop_at = time.time() + args.duration
+    if args.driver == 'asyncio':
+        async def run_all():
+            await asyncio.gather(*(async_client(i, args, ops, weights, stop_at, rec)
+                                   for i in range(args.clients)))
+        asyncio.run(run_all())
+    else:
+        threads = [threading.Thread(target=thread_client, args=(i, args, ops, weights, stop_at, rec),
+                                    daemon=True) for i in range(args.clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+
+def summarize(args, rec, elapsed, rss):
+    def stats_for(samples, errors, rejected):
+        total = len(samples) + errors
+        return {
+            "count": total,
+            "errors": errors,
+            "rejected": rejected,
+            "error_rate": errors / total if total else 0.0,
+            "p50_ms": _ms(percentile(samples, 50)),
+            "p95_ms": _ms(percentile(samples, 95)),
+            "p99_ms": _ms(percentile(samples, 99)),
+            "max_ms": _ms(max(samples) if samples else None),
+        }
+
+    every = [s for samples in rec.latency.values() for s in samples]
+    n_errors = sum(rec.errors.values())
+    by_op = {op: stats_for(rec.latency.get(op, []), rec.errors.get(op, 0), rec.rejected.get(op, 0))
+             for op in sorted(set(rec.latency) | set(rec.errors))}
+    rss_values = [kb for _, kb in rss if kb is not None]
+    return {
+        "config": {
+            "clients": args.clients, "driver": args.driver, "mix": args.mix,
+            "duration_s": args.duration, "ops_per_client": args.ops,
+            "server_mode": args.server_mode if args.spawn else None,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round((len(every) + n_errors) / elapsed, 1) if elapsed else 0.0,
+        "overall": stats_for(every, n_errors, sum(rec.rejected.values())),
+        "by_op": by_op,
+        "server_rss_kb": {
+            "peak": max(rss_values) if rss_values else None,
+            "samples": rss,
+        },
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=12600)
+    ap.add_argument('--spawn', action='store_true', help='start a lobby in a temp dir')
+    ap.add_argument('--server-mode', choices=['threaded', 'asyncio'], default='threaded')
+    ap.add_argument('--server-pid', type=int, default=None, help='pid to sample RSS from')
+    ap.add_argument('--clients', type=int, default=100)
+    ap.add_argument('--driver', choices=['threads', 'asyncio'], default='asyncio')
+    ap.add_argument('--mix', default=DEFAULT_MIX)
+    ap.add_argument('--duration', type=float, default=10.0)
+    ap.add_argument('--ops', type=int, default=0, help='stop each client after N ops (0 = duration only)')
+    ap.add_argument('--timeout', type=float, default=5.0)
+    ap.add_argument('--sample-interval', type=float, default=0.5)
+    ap.add_argument('--output', default=None)
+    args = ap.parse_args()
+
+    raise_fd_limit()
+    ops, weights = parse_mix(args.mix)
+    workdir = proc = None
+    pid = args.server_pid
+    if args.spawn:
+        workdir = tempfile.TemporaryDirectory()
+        proc = start_lobby(args.server_mode, args.port, workdir.name)
+        pid = proc.pid
+
+    rss = []
+    sampling = threading.Event()
+    t_start = time.perf_counter()
+
+    def sampler():
+        while True:
+            if pid:
+                rss.append([round(time.perf_counter() - t_start, 3), read_rss_kb(pid)])
+            if sampling.wait(args.sample_interval):
+                return
+    st = threading.Thread(target=sampler, daemon=True)
+    st.start()
+
+    rec = Recorder()
+    try:
+        drive(args, ops, weights, rec)
+    finally:
+        elapsed = time.perf_counter() - t_start
+        sampling.set()
+        st.join()
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+            workdir.cleanup()
+
+    summary = summarize(args, rec, elapsed, rss)
+    text = json.dumps(summary, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from bench_lobby import percentile, raise_fd_limit, start_lobby
+from common import ENC
+
+
+async def rpc(conn, obj):
+    reader, writer = conn
+    writer.write(json.dumps(obj, separators=(",", ":")).encode(ENC) + b"\n")
+    await writer.drain()
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError('closed')
+    return json.loads(line.decode(ENC))
+
+
+async def open_session(port, sem, timeout):
+    async with sem:
+        conn = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+        await asyncio.wait_for(rpc(conn, {"type": "PING"}), timeout)
+        return conn
+
+
+async def measure(port, n_conns, n_requests, timeout):
+    sem = asyncio.Semaphore(200)
+    results = await asyncio.gather(
+        *(open_session(port, sem, timeout) for _ in range(n_conns)),
+        return_exceptions=True)
+    conns = [r for r in results if not isinstance(r, BaseException)]
+    failed = len(results) - len(conns)
+
+    latencies = []
+    errors = 0
+
+    async def worker(conn, i):
+        nonlocal errors
+        for _ in range(n_requests):
+            t0 = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    rpc(conn, {"type": "REPORT", "username": f"load_{i % 16}",
+                               "delta": {"wins": 1}}), timeout)
+                latencies.append(time.perf_counter() - t0)
+            except Exception:
+                errors += 1
+                return
+
+    active = conns[:min(len(conns), 64)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(c, i) for i, c in enumerate(active)))
+    elapsed = time.perf_counter() - t0
+
+    for _, writer in conns:
+        writer.close()
+    return {
+        'opened': len(conns),
+        'failed': failed,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': (percentile(latencies, 50) or 0.0) * 1000,
+        'p99_ms': (percentile(latencies, 99) or 0.0) * 1000,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--connections', type=int, default=5000)
+    ap.add_argument('--requests', type=int, default=50)
+    ap.add_argument('--port', type=int, default=12500)
+    ap.add_argument('--timeout', type=float, default=5.0)
+    ap.add_argument('--modes', nargs='+', default=['threaded', 'asyncio'])
+    args = ap.parse_args()
+
+    limit = raise_fd_limit()
+    print(f"[load] {args.connections} idle sessions, 64 active x {args.requests} REPORT (fd limit {limit})")
+    for i, mode in enumerate(args.modes):
+        port = args.port + i
+        with tempfile.TemporaryDirectory() as workdir:
+            proc = start_lobby(mode, port, workdir)
+            try:
+                r = asyncio.run(measure(port, args.connections, args.requests, args.timeout))
+            finally:
+                proc.kill()
+                proc.wait()
+        print(f"  {mode:9s} opened={r['opened']:6d} failed={r['failed']:5d} "
+              f"errors={r['errors']:4d} rps={r['rps']:8.0f} "
+              f"p50={r['p50_ms']:7.2f}ms p99={r['p99_ms']:7.2f}ms")
+
+if __name__ == '__main__':
+    main()
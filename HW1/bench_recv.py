@@ -0,0 +1,82 @@
+import argparse
+import json
+import socket
+import threading
+import time
+from common import ENC, JsonLineSocket, send_json_line
+from connect4 import Connect4
+
+
+def recv_json_line_bytewise(conn):
+    buf = b""
+    while True:
+        ch = conn.recv(1)
+        if not ch:
+            if buf:
+                raise ConnectionError("connection closed mid-line")
+            return None
+        if ch == b"\n":
+            break
+        buf += ch
+    return json.loads(buf.decode(ENC))
+
+
+def state_message():
+    g = Connect4()
+    for col in (3, 3, 2, 4, 1, 5, 0):
+        if g.winner is None:
+            g.drop(col)
+    return {"type": "STATE", **g.copy_state()}
+
+
+def writer(sock, msg, count):
+    payload = json.dumps(msg, separators=(",", ":")).encode(ENC) + b"\n"
+    batch = payload * 64
+    sent = 0
+    while sent + 64 <= count:
+        sock.sendall(batch)
+        sent += 64
+    for _ in range(count - sent):
+        send_json_line(sock, msg)
+    sock.shutdown(socket.SHUT_WR)
+
+
+def run(recv, count, msg):
+    a, b = socket.socketpair()
+    t = threading.Thread(target=writer, args=(a, msg, count), daemon=True)
+    start = time.perf_counter()
+    t.start()
+    n = 0
+    while recv(b) is not None:
+        n += 1
+    elapsed = time.perf_counter() - start
+    t.join()
+    a.close()
+    b.close()
+    assert n == count, (n, count)
+    return count / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=20000)
+    args = ap.parse_args()
+
+    msg = state_message()
+    size = len(json.dumps(msg, separators=(",", ":"))) + 1
+    print(f"[bench] {args.count} STATE messages, {size} bytes each")
+
+    before = run(recv_json_line_bytewise, args.count, msg)
+    print(f"  recv(1) per byte   : {before:12.0f} msg/s")
+
+    readers = {}
+    def buffered(sock):
+        js = readers.get(sock)
+        if js is None:
+            js = readers[sock] = JsonLineSocket(sock)
+        return js.recv()
+    after = run(buffered, args.count, msg)
+    print(f"  buffered LineReader: {after:12.0f} msg/s  ({after / before:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+import lobby_server as ls
+
+
+class SlowLock:
+    # models work done inside the critical section (what save_persist used to be)
+    def __init__(self, hold):
+        self.lock = threading.Lock()
+        self.hold = hold
+
+    def __enter__(self):
+        self.lock.acquire()
+        time.sleep(self.hold)
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+def run(n_threads, n_ops, n_users):
+    def worker(i):
+        session = {}
+        for j in range(n_ops):
+            msg = {"type": "REPORT", "username": f"user_{(i * 7919 + j) % n_users}",
+                   "delta": {"wins": 1}}
+            ls.process_message(msg, session)
+            ls.journal.wait(session.pop('commit', 0))
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return n_threads * n_ops / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--shards', type=ls.positive_int, nargs='+', default=[1, 4, 16, 64])
+    ap.add_argument('--threads', type=int, default=64)
+    ap.add_argument('--ops', type=int, default=200)
+    ap.add_argument('--users', type=int, default=10000)
+    ap.add_argument('--hold-ms', type=float, nargs='+', default=[0.0, 1.0])
+    args = ap.parse_args()
+
+    print(f"[bench] REPORT contention, {args.threads} threads x {args.ops} ops over {args.users} users")
+    for hold in args.hold_ms:
+        for n in args.shards:
+            with tempfile.TemporaryDirectory() as workdir:
+                os.chdir(workdir)
+                ls.init_shards(n)
+                ls.load_persist()
+                if hold:
+                    for sh in ls.shards:
+                        sh.lock = SlowLock(hold / 1000)
+                rate = run(args.threads, args.ops, args.users)
+                ls.journal.close()
+                os.chdir('/')
+            print(f"  hold={hold:4.1f}ms shards={n:3d}  {rate:9.0f} ops/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+from connect4 import BitboardConnect4
+from solver import Solver
+
+# move sequences (columns 0-6) from the empty board, early game to endgame
+SUITE = [
+    "",
+    "33",
+    "21350064",
+    "02404100330105",
+    "40001140632346141523",
+    "020665653441442662205561",
+    "2360116402324334035615522131",
+]
+
+
+def position(moves):
+    g = BitboardConnect4()
+    for ch in moves:
+        g.drop(int(ch))
+    return g
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--budget', type=float, default=5.0)
+    ap.add_argument('--tt-size', type=int, default=1 << 20)
+    args = ap.parse_args()
+
+    print(f"[bench] negamax/alpha-beta, {args.budget}s budget per position")
+    print(f"  {'moves':>5} {'best':>4} {'score':>6} {'depth':>5} {'solved':>6} {'nodes':>9} {'time':>8} {'nodes/s':>9}")
+    total_nodes = total_time = 0.0
+    for moves in SUITE:
+        r = Solver(args.tt_size).search(position(moves), args.budget)
+        total_nodes += r['nodes']
+        total_time += r['elapsed']
+        nps = r['nodes'] / r['elapsed'] if r['elapsed'] else 0.0
+        print(f"  {len(moves):5d} {r['col']:4d} {r['score']:6d} {r['depth']:5d} {str(r['solved']):>6} "
+              f"{r['nodes']:9d} {r['elapsed']:7.2f}s {nps:9.0f}")
+    print(f"  overall {total_nodes / total_time:.0f} nodes/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import random
+import socket
+import statistics
+import threading
+import time
+
+from player_a import send_invite, send_tcp_info
+from player_b import udp_wait_loop
+from reliable_udp import ReliableUDP
+
+
+class LossySocket:
+    # drops each outgoing datagram with probability loss
+    def __init__(self, sock, loss, rng):
+        self.sock = sock
+        self.loss = loss
+        self.rng = rng
+        self.sent = 0
+        self.dropped = 0
+
+    def sendto(self, data, addr):
+        self.sent += 1
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return len(data)
+        return self.sock.sendto(data, addr)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def one_trial(loss, rng):
+    bs = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    bs.bind(('127.0.0.1', 0))
+    port = bs.getsockname()[1]
+    result = {}
+
+    def b_side():
+        result['b'] = udp_wait_loop(port, True, sock=LossySocket(bs, loss, rng))
+
+    t = threading.Thread(target=b_side, daemon=True)
+    t.start()
+
+    a = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    la = LossySocket(a, loss, rng)
+    ru = ReliableUDP(la)
+    t0 = time.perf_counter()
+    accepted = send_invite(ru, ('127.0.0.1', port), 'bench', reply_timeout=10)
+    if accepted:
+        send_tcp_info(ru, ('127.0.0.1', port), {"host": "127.0.0.1", "port": 1})
+    t.join(5)
+    elapsed = time.perf_counter() - t0
+    a.close()
+    ok = bool(accepted) and result.get('b', (None,))[0] == ('127.0.0.1', 1, None)
+    return ok, elapsed, ru.retransmits
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--loss', type=float, nargs='+', default=[0.0, 0.1, 0.3])
+    ap.add_argument('--trials', type=int, default=100)
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'loss':>5} {'ok':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'resends':>8} {'one-shot ok':>11}")
+    for loss in args.loss:
+        oks, times, resends = 0, [], 0
+        for _ in range(args.trials):
+            ok, dt, rt = one_trial(loss, rng)
+            oks += ok
+            resends += rt
+            if ok:
+                times.append(dt * 1000)
+        times.sort()
+        p50 = statistics.median(times) if times else float('nan')
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))] if times else float('nan')
+        mx = times[-1] if times else float('nan')
+        # the old exchange was three unacknowledged datagrams
+        one_shot = (1 - loss) ** 3
+        print(f'{loss:>5.2f} {oks:>4}/{args.trials:<3} {p50:>8.2f} {p99:>8.1f} {mx:>8.1f} '
+              f'{resends:>8} {one_shot:>10.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,39 +2,103 @@ import json
 import socket
 import sys
 import time
+import weakref
 
 ENC = "utf-8"
+MAX_LINE = 64 * 1024
+RECV_CHUNK = 64 * 1024
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+class LineReader:
+    def __init__(self, sock, max_line=MAX_LINE, chunk_size=RECV_CHUNK):
+        self.sock = sock
+        self.max_line = max_line
+        self._chunk = bytearray(chunk_size)
+        self._view = memoryview(self._chunk)
+        self._partial = bytearray()
+        self._lines = []
+        self._next = 0
+        self._error = None
+        self.eof = False
+
+    def readline(self):
+        while self._next >= len(self._lines):
+            if self._error is not None:
+                raise self._error
+            if self.eof or not self._fill():
+                if self._partial:
+                    raise ConnectionError("connection closed mid-line")
+                return None
+        line = self._lines[self._next]
+        self._next += 1
+        return line
+
+    def _fill(self):
+        n = self.sock.recv_into(self._chunk)
+        if n == 0:
+            self.eof = True
+            return False
+        self._lines = []
+        self._next = 0
+        chunk = self._chunk
+        start = 0
+        while True:
+            i = chunk.find(b"\n", start, n)
+            if i < 0:
+                break
+            if self._partial:
+                self._partial += self._view[start:i]
+                line = bytes(self._partial)
+                self._partial.clear()
+            else:
+                line = bytes(self._view[start:i])
+            if len(line) > self.max_line:
+                # complete lines before it in this chunk are still returned first
+                self._error = LineTooLong(f"line exceeds {self.max_line} bytes")
+                return True
+            self._lines.append(line)
+            start = i + 1
+        if start < n:
+            self._partial += self._view[start:n]
+            if len(self._partial) > self.max_line:
+                self._partial.clear()
+                self._error = LineTooLong(f"line exceeds {self.max_line} bytes")
+        return True
+
+
+_readers = weakref.WeakKeyDictionary()
+
 
 def send_json_line(conn, obj):
     data = json.dumps(obj, separators=(",", ":")).encode(ENC) + b"\n"
     conn.sendall(data)
 
 def recv_json_line(conn):
-    buf = b""
-    while True:
-        ch = conn.recv(1)
-        if not ch:
-            if buf:
-                raise ConnectionError("connection closed mid-line")
-            return None
-        if ch == b"\n":
-            break
-        buf += ch
-    return json.loads(buf.decode(ENC))
+    reader = _readers.get(conn)
+    if reader is None:
+        reader = _readers[conn] = LineReader(conn)
+    line = reader.readline()
+    if line is None:
+        return None
+    return json.loads(line.decode(ENC))
 
 class JsonLineSocket:
-    def __init__(self, sock):
+    def __init__(self, sock, max_line=MAX_LINE):
         self.sock = sock
         self.sock.settimeout(30)
-        self.file = self.sock.makefile("rwb", buffering=0)
+        self.reader = LineReader(sock, max_line=max_line)
 
     def send(self, obj):
         data = json.dumps(obj, separators=(",", ":")).encode(ENC) + b"\n"
-        self.file.write(data)
+        self.sock.sendall(data)
 
     def recv(self):
-        line = self.file.readline()
-        if not line:
+        line = self.reader.readline()
+        if line is None:
             return None
         return json.loads(line.decode(ENC))
 
@@ -52,4 +116,4 @@ def bind_with_retry(host, port, max_tries=10):
                 time.sleep(0.1)
             else:
                 raise
-    raise OSError("cannot bind after retries")
\ No newline at end of file
+    raise OSError("cannot bind after retries")
@@ -1,3 +1,5 @@
+import random
+
 ROWS, COLS = 6, 7
 EMPTY = 0
 A_STONE = 1
@@ -45,4 +47,109 @@ class Connect4:
             cnt += 1
             i += dr
             j += dc
-        return cnt
\ No newline at end of file
+        return cnt
+
+H = ROWS + 1  # bits per column, the extra bit is a sentinel so shifts never wrap
+_rng = random.Random(0xC4)
+ZOBRIST = [[_rng.getrandbits(64) for _ in range(COLS * H)] for _ in range(2)]
+ZOBRIST_TURN = _rng.getrandbits(64)
+
+
+class BitboardConnect4:
+    def __init__(self):
+        self.bitboards = [0, 0]
+        self.heights = [c * H for c in range(COLS)]
+        self.moves = []
+        self.turn = 'A'
+        self.winner = None
+        self.hash = 0
+
+    @classmethod
+    def from_state(cls, state):
+        g = cls()
+        for c in range(COLS):
+            for r in range(ROWS - 1, -1, -1):
+                stone = state['board'][r][c]
+                if stone == EMPTY:
+                    break
+                side = 0 if stone == A_STONE else 1
+                pos = g.heights[c]
+                g.heights[c] = pos + 1
+                g.bitboards[side] |= 1 << pos
+                g.hash ^= ZOBRIST[side][pos]
+                g.moves.append(c)
+        g.turn = state['turn']
+        # drop() toggles the turn key on every move, including the final one
+        # where the turn stays put, so parity follows the move count
+        if len(g.moves) % 2:
+            g.hash ^= ZOBRIST_TURN
+        g.winner = state.get('winner')
+        return g
+
+    @property
+    def mask(self):
+        return self.bitboards[0] | self.bitboards[1]
+
+    def copy_state(self):
+        a, b = self.bitboards
+        board = [[EMPTY] * COLS for _ in range(ROWS)]
+        for r in range(ROWS):
+            for c in range(COLS):
+                bit = 1 << (c * H + ROWS - 1 - r)
+                if a & bit:
+                    board[r][c] = A_STONE
+                elif b & bit:
+                    board[r][c] = B_STONE
+        return {
+            'board': board,
+            'turn': self.turn,
+            'winner': self.winner
+        }
+
+    def can_play(self, col):
+        return 0 <= col < COLS and self.heights[col] < col * H + ROWS
+
+    def legal_moves(self):
+        return [c for c in range(COLS) if self.heights[c] < c * H + ROWS]
+
+    def drop(self, col):
+        if self.winner is not None:
+            raise ValueError('game finished')
+        if not (0 <= col < COLS):
+            raise ValueError('invalid column')
+        if self.heights[col] >= col * H + ROWS:
+            raise ValueError('column full')
+        side = 0 if self.turn == 'A' else 1
+        pos = self.heights[col]
+        self.heights[col] = pos + 1
+        bb = self.bitboards[side] | (1 << pos)
+        self.bitboards[side] = bb
+        self.hash ^= ZOBRIST[side][pos] ^ ZOBRIST_TURN
+        self.moves.append(col)
+        if has_four(bb):
+            self.winner = self.turn
+        elif len(self.moves) == ROWS * COLS:
+            self.winner = 'draw'
+        else:
+            self.turn = 'B' if side == 0 else 'A'
+
+    def undo(self):
+        if not self.moves:
+            raise ValueError('no move to undo')
+        col = self.moves.pop()
+        pos = self.heights[col] - 1
+        self.heights[col] = pos
+        side = 0 if self.bitboards[0] >> pos & 1 else 1
+        self.bitboards[side] &= ~(1 << pos)
+        self.hash ^= ZOBRIST[side][pos] ^ ZOBRIST_TURN
+        self.turn = 'A' if side == 0 else 'B'
+        self.winner = None
+        return col
+
+
+def has_four(bb):
+    for shift in (1, H, H - 1, H + 1):
+        m = bb & (bb >> shift)
+        if m & (m >> (2 * shift)):
+            return True
+    return False
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+from common import ENC
+
+
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        self.old_path = path + '.old'
+        self._cv = threading.Condition()
+        self._pending = []
+        self._seq = 0
+        self._durable = 0
+        self._flushing = False
+        self._f = open(path, 'ab')
+        self.size = self._f.tell()
+
+    def append(self, record):
+        line = json.dumps(record, separators=(",", ":")).encode(ENC) + b"\n"
+        with self._cv:
+            self._pending.append(line)
+            self._seq += 1
+            return self._seq
+
+    def wait(self, seq):
+        # group commit: whoever finds no flush in progress writes and fsyncs
+        # everything queued so far, the others wait for it and return together
+        with self._cv:
+            while self._durable < seq:
+                if self._flushing:
+                    self._cv.wait()
+                else:
+                    self._flush_locked()
+
+    def _flush_locked(self):
+        batch, self._pending = self._pending, []
+        upto = self._seq
+        data = b"".join(batch)
+        self._flushing = True
+        self._cv.release()
+        try:
+            self._f.write(data)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        except Exception:
+            self._cv.acquire()
+            self._pending[:0] = batch
+            self._flushing = False
+            self._cv.notify_all()
+            raise
+        self._cv.acquire()
+        self.size += len(data)
+        self._durable = upto
+        self._flushing = False
+        self._cv.notify_all()
+
+    def rotate(self):
+        with self._cv:
+            while self._flushing or self._pending:
+                if self._flushing:
+                    self._cv.wait()
+                else:
+                    self._flush_locked()
+            self._f.close()
+            if os.path.exists(self.old_path):
+                # an earlier compaction failed before its snapshot was saved;
+                # those records are in no snapshot yet, so keep them
+                with open(self.path, 'rb') as src, open(self.old_path, 'ab') as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.old_path)
+            self._f = open(self.path, 'ab')
+            self.size = 0
+
+    def discard_old(self):
+        if os.path.exists(self.old_path):
+            os.remove(self.old_path)
+
+    def close(self):
+        with self._cv:
+            while self._flushing or self._pending:
+                if self._flushing:
+                    self._cv.wait()
+                else:
+                    self._flush_locked()
+            self._f.close()
+
+    @staticmethod
+    def replay(*paths):
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn tail from a crash mid-append
+                    yield json.loads(line.decode(ENC))
+
+
+def write_json_atomic(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -0,0 +1,176 @@
+import random
+import threading
+
+MAX_LEVEL = 24
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class IndexableSkipList:
+    # skip list whose links also store how many bottom-level nodes they jump,
+    # which gives O(log n) insert, remove, rank-of-key and key-at-rank
+    def __init__(self, seed=None):
+        self.head = _Node(None, MAX_LEVEL)
+        self.size = 0
+        self._rng = random.Random(seed)
+
+    def __len__(self):
+        return self.size
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and self._rng.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key):
+        chain = [None] * MAX_LEVEL
+        steps_at_level = [0] * MAX_LEVEL
+        node = self.head
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            nxt = node.next[lvl]
+            while nxt is not None and nxt.key < key:
+                steps_at_level[lvl] += node.width[lvl]
+                node = nxt
+                nxt = node.next[lvl]
+            chain[lvl] = node
+        d = self._random_level()
+        new = _Node(key, d)
+        steps = 0
+        for lvl in range(d):
+            prev = chain[lvl]
+            new.next[lvl] = prev.next[lvl]
+            prev.next[lvl] = new
+            new.width[lvl] = prev.width[lvl] - steps
+            prev.width[lvl] = steps + 1
+            steps += steps_at_level[lvl]
+        for lvl in range(d, MAX_LEVEL):
+            chain[lvl].width[lvl] += 1
+        self.size += 1
+
+    @classmethod
+    def from_sorted(cls, keys, seed=None):
+        sl = cls(seed)
+        last = [sl.head] * MAX_LEVEL
+        last_pos = [0] * MAX_LEVEL
+        pos = 0
+        for pos, key in enumerate(keys, 1):
+            d = sl._random_level()
+            node = _Node(key, d)
+            for lvl in range(d):
+                last[lvl].next[lvl] = node
+                last[lvl].width[lvl] = pos - last_pos[lvl]
+                last[lvl] = node
+                last_pos[lvl] = pos
+        for lvl in range(MAX_LEVEL):
+            last[lvl].width[lvl] = pos + 1 - last_pos[lvl]
+        sl.size = pos
+        return sl
+
+    def remove(self, key):
+        chain = [None] * MAX_LEVEL
+        node = self.head
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            nxt = node.next[lvl]
+            while nxt is not None and nxt.key < key:
+                node = nxt
+                nxt = node.next[lvl]
+            chain[lvl] = node
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        d = len(target.next)
+        for lvl in range(d):
+            prev = chain[lvl]
+            prev.width[lvl] += target.width[lvl] - 1
+            prev.next[lvl] = target.next[lvl]
+        for lvl in range(d, MAX_LEVEL):
+            chain[lvl].width[lvl] -= 1
+        self.size -= 1
+
+    def index(self, key):
+        node = self.head
+        steps = 0
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            nxt = node.next[lvl]
+            while nxt is not None and nxt.key < key:
+                steps += node.width[lvl]
+                node = nxt
+                nxt = node.next[lvl]
+        nxt = node.next[0]
+        if nxt is None or nxt.key != key:
+            raise KeyError(key)
+        return steps
+
+    def slice(self, start, stop):
+        if start >= self.size or stop <= start:
+            return []
+        node = self.head
+        i = start + 1
+        for lvl in range(MAX_LEVEL - 1, -1, -1):
+            while node.next[lvl] is not None and node.width[lvl] <= i:
+                i -= node.width[lvl]
+                node = node.next[lvl]
+        out = []
+        while node is not None and len(out) < stop - start:
+            out.append(node.key)
+            node = node.next[0]
+        return out
+
+
+class Leaderboard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ranks = IndexableSkipList()
+        self.keys = {}
+        self.versions = {}
+
+    @staticmethod
+    def key_for(u, st):
+        return (-st.get('wins', 0), st.get('loses', 0), str(u))
+
+    def update(self, u, st, version=None):
+        # version orders updates made after the caller dropped its own lock;
+        # an older copy of the stats arriving late is ignored
+        key = self.key_for(u, st)
+        with self.lock:
+            if version is not None:
+                if version <= self.versions.get(u, 0):
+                    return
+                self.versions[u] = version
+            old = self.keys.get(u)
+            if old == key:
+                return
+            if old is not None:
+                self.ranks.remove(old)
+            self.ranks.insert(key)
+            self.keys[u] = key
+
+    def rebuild(self, stats):
+        keys = {u: self.key_for(u, st) for u, st in stats.items()}
+        ranks = IndexableSkipList.from_sorted(sorted(keys.values()))
+        with self.lock:
+            self.ranks = ranks
+            self.keys = keys
+            # versions come from the shards, which start over when they are rebuilt
+            self.versions = {}
+
+    def rank(self, u):
+        with self.lock:
+            key = self.keys.get(u)
+            if key is None:
+                return None
+            return self.ranks.index(key) + 1, len(self.ranks)
+
+    def top(self, k, start=0):
+        with self.lock:
+            keys = self.ranks.slice(start, start + k)
+        return [{"rank": start + i + 1, "username": u, "wins": -negw, "loses": loses}
+                for i, (negw, loses, u) in enumerate(keys)]
@@ -0,0 +1,157 @@
+import socket
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from common import JsonLineSocket
+
+CONNECTION_LOST = {"ok": False, "msg": "CONNECTION_LOST"}
+
+
+class LobbyClient:
+    def __init__(self, host, port, username, password, keepalive=10.0, timeout=30.0):
+        self.addr = (host, port)
+        self.u = username
+        self.p = password
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.js = None
+        self.next_id = 0
+        self.waiters = {}
+        self.logged_in = False
+        self.closed = False
+
+    def _connect(self):
+        s = socket.create_connection(self.addr)
+        js = JsonLineSocket(s)
+        s.settimeout(None)
+        self.js = js
+        threading.Thread(target=self._reader, args=(js,), daemon=True).start()
+        if self.keepalive:
+            threading.Thread(target=self._pinger, args=(js,), daemon=True).start()
+        if self.logged_in:
+            # the lobby dropped us from `online` with the old connection
+            self._send_locked({"type":"LOGIN","username":self.u,"password":self.p})
+
+    def _send_locked(self, obj):
+        self.next_id += 1
+        obj = {**obj, "id": self.next_id}
+        fut = Future()
+        self.waiters[self.next_id] = fut
+        self.js.send(obj)
+        return fut
+
+    def submit(self, obj):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.js is None:
+                        self._connect()
+                    return self._send_locked(obj)
+                except OSError:
+                    self._drop(self.js)
+                    if attempt:
+                        fut = Future()
+                        fut.set_result(dict(CONNECTION_LOST))
+                        return fut
+
+    def _drop(self, js):
+        # caller holds self.lock
+        if js is None or js is not self.js:
+            return
+        self.js = None
+        try:
+            js.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        js.sock.close()
+        waiters, self.waiters = self.waiters, {}
+        for fut in waiters.values():
+            fut.set_result(dict(CONNECTION_LOST))
+
+    def _reader(self, js):
+        try:
+            while True:
+                msg = js.recv()
+                if msg is None:
+                    break
+                with self.lock:
+                    fut = self.waiters.pop(msg.get('id'), None)
+                if fut is not None:
+                    fut.set_result(msg)
+        except Exception:
+            pass
+        with self.lock:
+            self._drop(js)
+
+    def _pinger(self, js):
+        ev = threading.Event()
+        while not ev.wait(self.keepalive):
+            with self.lock:
+                if js is not self.js:
+                    return
+                try:
+                    self._send_locked({"type":"PING"})
+                except OSError:
+                    self._drop(js)
+                    return
+
+    def _result(self, fut, timeout):
+        try:
+            return fut.result(timeout)
+        except FutureTimeout:
+            # forget the request, a late reply is then simply dropped
+            with self.lock:
+                for rid, w in list(self.waiters.items()):
+                    if w is fut:
+                        del self.waiters[rid]
+                        break
+            return {"ok": False, "msg": "TIMEOUT"}
+
+    def _rpc(self, obj):
+        return self._result(self.submit(obj), self.timeout)
+
+    def pipeline(self, objs):
+        # one deadline for the whole batch; a lost reply only fills its own slot
+        futs = [self.submit(o) for o in objs]
+        deadline = time.monotonic() + self.timeout
+        return [self._result(f, max(0.0, deadline - time.monotonic())) for f in futs]
+
+    def register(self):
+        return self._rpc({"type":"REGISTER","username":self.u,"password":self.p})
+
+    def login(self):
+        r = self._rpc({"type":"LOGIN","username":self.u,"password":self.p})
+        if r.get('ok'):
+            self.logged_in = True
+        return r
+
+    def report(self, delta):
+        return self._rpc({"type":"REPORT","username":self.u,"delta":delta})
+
+    def top(self, k=10, start=0):
+        return self._rpc({"type":"TOP","k":k,"start":start})
+
+    def rank(self, username=None):
+        return self._rpc({"type":"RANK","username":username or self.u})
+
+    def advertise(self, udp_port, tcp_port=None, host=None, status='waiting', ttl=30):
+        return self._rpc({"type":"ADVERTISE","udp_port":udp_port,"tcp_port":tcp_port,
+                          "host":host,"status":status,"ttl":ttl})
+
+    def withdraw(self):
+        return self._rpc({"type":"WITHDRAW"})
+
+    def list_waiting(self, status='waiting'):
+        r = self._rpc({"type":"LIST_WAITING","status":status})
+        return r.get('players', []) if r.get('ok') else []
+
+    def logout(self):
+        self.logged_in = False
+        r = self._rpc({"type":"LOGOUT","username":self.u})
+        self.close()
+        return r
+
+    def close(self):
+        with self.lock:
+            self._drop(self.js)
@@ -1,136 +1,429 @@
 import argparse
+import asyncio
+import heapq
 import json
+import math
 import os
 import socket
 import threading
-from common import JsonLineSocket
+import time
+import zlib
+from common import ENC, MAX_LINE, JsonLineSocket, LineTooLong
+from journal import Journal, write_json_atomic
+from leaderboard import Leaderboard
 
 USERS_FILE = 'users.json'
 STATS_FILE = 'stats.json'
+JOURNAL_FILE = 'lobby.journal'
+CLIENT_TIMEOUT = 30
 
-lock = threading.Lock()
+class Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = {}
+        self.online = set()
+        self.stats = {}
+        self.versions = {}  # username -> stats version, for leaderboard updates
 
-users = {}       
-online = set()   
-stats = {}     
+
+shards = [Shard()]
+journal = None
+leaderboard = Leaderboard()
+
+
+def init_shards(n):
+    global shards
+    shards = [Shard() for _ in range(n)]
+
+
+def shard_for(u):
+    return shards[zlib.crc32(str(u).encode(ENC)) % len(shards)]
+
+
+waiting_lock = threading.Lock()
+waiting = {}       # username -> advertised endpoint
+waiting_heap = []  # (expires, username), stale pairs are skipped on pop
+DEFAULT_TTL = 30
+MAX_TTL = 300
+MAX_TOP = 100
 
 
 def load_persist():
-    global users, stats
+    global journal
     if os.path.exists(USERS_FILE):
         with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            users = json.load(f)
+            for u, p in json.load(f).items():
+                shard_for(u).users[u] = p
     if os.path.exists(STATS_FILE):
         with open(STATS_FILE, 'r', encoding='utf-8') as f:
-            stats = json.load(f)
+            for u, st in json.load(f).items():
+                shard_for(u).stats[u] = st
+    for rec in Journal.replay(JOURNAL_FILE + '.old', JOURNAL_FILE):
+        apply_record(rec)
+    journal = Journal(JOURNAL_FILE)
+    compact()
+    leaderboard.rebuild(snapshot()[1])
+
+
+def apply_record(rec):
+    u = rec['u']
+    sh = shard_for(u)
+    if 'p' in rec:
+        sh.users[u] = rec['p']
+    if 's' in rec:
+        sh.stats[u] = rec['s']
+
+
+def log_change(session, sh, u, password=None):
+    # caller holds sh.lock; the response is sent once the record is durable
+    rec = {"u": u, "s": dict(sh.stats[u])}
+    if password is not None:
+        rec['p'] = password
+    session['commit'] = journal.append(rec)
+
+
+def snapshot():
+    snap_users, snap_stats = {}, {}
+    for sh in shards:
+        with sh.lock:
+            snap_users.update(sh.users)
+            snap_stats.update((u, dict(st)) for u, st in sh.stats.items())
+    return snap_users, snap_stats
+
+
+def save_persist(snap_users, snap_stats):
+    write_json_atomic(USERS_FILE, snap_users)
+    write_json_atomic(STATS_FILE, snap_stats)
+
+
+def compact():
+    # Records written before the rotation are all reflected in the copy taken
+    # after it, and replaying newer records over that copy is idempotent, so
+    # no shard lock has to be held across the rotation or the disk writes.
+    journal.rotate()
+    save_persist(*snapshot())
+    journal.discard_old()
+
+
+def compactor_loop(interval, min_bytes):
+    while True:
+        time.sleep(interval)
+        if journal.size >= min_bytes:
+            try:
+                compact()
+            except Exception as e:
+                print(f"[lobby] compaction failed: {e}")
+
+
+def copy_stats(sh, u):
+    # caller holds sh.lock; the copy goes to the leaderboard after it is released
+    sh.versions[u] = sh.versions.get(u, 0) + 1
+    return dict(sh.stats[u]), sh.versions[u]
+
+
+def ensure_user_stats(sh, u):
+    if u not in sh.stats:
+        sh.stats[u] = {"wins": 0, "loses": 0, "logins": 0}
+    if "logins" not in sh.stats[u]:
+        sh.stats[u]["logins"] = 0
+
+
+def process_message(msg, session):
+    resp, done = _process(msg, session)
+    if 'id' in msg:
+        resp['id'] = msg['id']
+    return resp, done
+
+
+def _process(msg, session):
+    t = msg.get('type')
+
+    if t == 'PING':
+        return {"ok": True, "msg": "PONG"}, False
+
+    elif t == 'REGISTER':
+        u, p = msg.get('username'), msg.get('password')
+        if not u or not p:
+            return {"ok": False, "msg": "INVALID_INPUT"}, False
+        sh = shard_for(u)
+        with sh.lock:
+            if u in sh.users:
+                return {"ok": False, "msg": "USER_EXISTS"}, False
+            sh.users[u] = p
+            ensure_user_stats(sh, u)
+            log_change(session, sh, u, password=p)
+            st, version = copy_stats(sh, u)
+        leaderboard.update(u, st, version)
+        return {"ok": True, "msg": "REGISTER_SUCCESS"}, False
+
+    elif t == 'LOGIN':
+        u, p = msg.get('username'), msg.get('password')
+        sh = shard_for(u)
+        with sh.lock:
+            if u not in sh.users or sh.users[u] != p:
+                return {"ok": False, "msg": "LOGIN_FAIL"}, False
+            if u in sh.online:
+                return {"ok": False, "msg": "DUPLICATE_LOGIN"}, False
+            sh.online.add(u)
+            ensure_user_stats(sh, u)
+            sh.stats[u]['logins'] += 1
+            log_change(session, sh, u)
+        session['username'] = u
+        return {"ok": True, "msg": "LOGIN_SUCCESS"}, False
+
+    elif t == 'REPORT':
+        u = msg.get('username')
+        delta = msg.get('delta', {})
+        if not u:
+            return {"ok": False, "msg": "INVALID_INPUT"}, False
+        sh = shard_for(u)
+        with sh.lock:
+            ensure_user_stats(sh, u)
+            for k, v in delta.items():
+                sh.stats[u][k] = sh.stats[u].get(k, 0) + int(v)
+            log_change(session, sh, u)
+            st, version = copy_stats(sh, u)
+        leaderboard.update(u, st, version)
+        return {"ok": True, "msg": "REPORT_OK"}, False
+
+    elif t == 'LOGOUT':
+        u = msg.get('username')
+        sh = shard_for(u)
+        with sh.lock:
+            sh.online.discard(u)
+        withdraw(u)
+        return {"ok": True, "msg": "LOGOUT_OK"}, True
+
+    elif t == 'TOP':
+        try:
+            k = max(0, min(int(msg.get('k', 10)), MAX_TOP))
+            start = max(0, int(msg.get('start', 0)))
+        except (TypeError, ValueError):
+            return {"ok": False, "msg": "INVALID_INPUT"}, False
+        return {"ok": True, "msg": "TOP", "players": leaderboard.top(k, start)}, False
+
+    elif t == 'RANK':
+        u = msg.get('username')
+        r = leaderboard.rank(u)
+        if r is None:
+            return {"ok": False, "msg": "NO_SUCH_USER"}, False
+        sh = shard_for(u)
+        with sh.lock:
+            st = dict(sh.stats.get(u, {}))
+        return {"ok": True, "msg": "RANK", "username": u, "rank": r[0], "total": r[1],
+                "wins": st.get('wins', 0), "loses": st.get('loses', 0)}, False
+
+    elif t == 'ADVERTISE':
+        return advertise(msg, session), False
+
+    elif t == 'WITHDRAW':
+        if not session.get('username'):
+            return {"ok": False, "msg": "NOT_LOGGED_IN"}, False
+        withdraw(session['username'])
+        return {"ok": True, "msg": "WITHDRAW_OK"}, False
+
+    elif t == 'LIST_WAITING':
+        return list_waiting(msg, session), False
+
+    return {"ok": False, "msg": "UNKNOWN_TYPE"}, False
+
 
+def expire_waiting(now):
+    # caller holds waiting_lock
+    while waiting_heap and waiting_heap[0][0] <= now:
+        expires, u = heapq.heappop(waiting_heap)
+        entry = waiting.get(u)
+        if entry is not None and entry['expires'] == expires:
+            del waiting[u]
 
-def save_persist():
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f)
-    with open(STATS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(stats, f)
+
+def advertise(msg, session):
+    u = session.get('username')
+    if not u:
+        return {"ok": False, "msg": "NOT_LOGGED_IN"}
+    try:
+        udp_port = int(msg['udp_port'])
+        tcp_port = int(msg['tcp_port']) if msg.get('tcp_port') is not None else None
+    except (KeyError, TypeError, ValueError):
+        return {"ok": False, "msg": "INVALID_INPUT"}
+    ttl = msg.get('ttl', DEFAULT_TTL)
+    # NaN, inf or a non-positive ttl would break or empty the expiry heap
+    if (isinstance(ttl, bool) or not isinstance(ttl, (int, float))
+            or not math.isfinite(ttl) or ttl <= 0):
+        return {"ok": False, "msg": "INVALID_INPUT"}
+    ttl = min(float(ttl), MAX_TTL)
+    now = time.time()
+    entry = {
+        "username": u,
+        "host": msg.get('host') or session.get('peer_host'),
+        "udp_port": udp_port,
+        "tcp_port": tcp_port,
+        "status": msg.get('status', 'waiting'),
+        "expires": now + ttl,
+    }
+    with waiting_lock:
+        expire_waiting(now)
+        waiting[u] = entry
+        heapq.heappush(waiting_heap, (entry['expires'], u))
+    return {"ok": True, "msg": "ADVERTISE_OK", "ttl": ttl}
+
+
+def withdraw(username):
+    with waiting_lock:
+        waiting.pop(username, None)
+
+
+def list_waiting(msg, session):
+    status = msg.get('status', 'waiting')
+    me = session.get('username')
+    now = time.time()
+    with waiting_lock:
+        expire_waiting(now)
+        players = [
+            {k: v for k, v in e.items() if k != 'expires'}
+            for e in waiting.values()
+            if e['username'] != me and (status is None or e['status'] == status)
+        ]
+    return {"ok": True, "msg": "WAITING", "players": players}
 
 
-def ensure_user_stats(u):
-    if u not in stats:
-        stats[u] = {"wins": 0, "loses": 0, "logins": 0}
-    if "logins" not in stats[u]:
-        stats[u]["logins"] = 0
+def end_session(session):
+    username = session.get('username')
+    if username:
+        withdraw(username)
+        sh = shard_for(username)
+        with sh.lock:
+            sh.online.discard(username)
 
 
 def handle_client(conn, addr):
     js = JsonLineSocket(conn)
-    username = None
+    session = {'username': None, 'peer_host': addr[0]}
     try:
         while True:
             msg = js.recv()
             if msg is None:
                 break
-            t = msg.get('type')
-
-            if t == 'REGISTER':
-                u, p = msg.get('username'), msg.get('password')
-                if not u or not p:
-                    js.send({"ok": False, "msg": "INVALID_INPUT"})
-                    continue
-                with lock:
-                    if u in users:
-                        js.send({"ok": False, "msg": "USER_EXISTS"})
-                    else:
-                        users[u] = p
-                        ensure_user_stats(u)
-                        save_persist()
-                        js.send({"ok": True, "msg": "REGISTER_SUCCESS"})
-
-            elif t == 'LOGIN':
-                u, p = msg.get('username'), msg.get('password')
-                with lock:
-                    if u not in users or users[u] != p:
-                        js.send({"ok": False, "msg": "LOGIN_FAIL"})
-                    elif u in online:
-                        js.send({"ok": False, "msg": "DUPLICATE_LOGIN"})
-                    else:
-                        online.add(u)
-                        ensure_user_stats(u)
-                        stats[u]['logins'] += 1
-                        save_persist()
-                        username = u
-                        js.send({"ok": True, "msg": "LOGIN_SUCCESS"})
-
-            elif t == 'REPORT':
-                u = msg.get('username')
-                delta = msg.get('delta', {})
-                with lock:
-                    ensure_user_stats(u)
-                    for k, v in delta.items():
-                        stats[u][k] = stats[u].get(k, 0) + int(v)
-                    save_persist()
-                js.send({"ok": True, "msg": "REPORT_OK"})
-
-            elif t == 'LOGOUT':
-                u = msg.get('username')
-                with lock:
-                    if u in online:
-                        online.remove(u)
-                        save_persist()
-                js.send({"ok": True, "msg": "LOGOUT_OK"})
+            resp, done = process_message(msg, session)
+            journal.wait(session.pop('commit', 0))
+            js.send(resp)
+            if done:
                 break
 
-            else:
-                js.send({"ok": False, "msg": "UNKNOWN_TYPE"})
-
     except Exception as e:
         try:
             js.send({"ok": False, "msg": f"SERVER_ERROR:{e}"})
         except Exception:
             pass
     finally:
-        if username:
-            with lock:
-                if username in online:
-                    online.remove(username)
-                    save_persist()
+        end_session(session)
         conn.close()
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument('--host', default='0.0.0.0')
-    ap.add_argument('--port', type=int, default=12000)
-    args = ap.parse_args()
+async def handle_client_async(reader, writer):
+    session = {'username': None, 'peer_host': writer.get_extra_info('peername')[0]}
+    loop = asyncio.get_running_loop()
+    pending = set()
 
-    load_persist()
+    def send(obj):
+        writer.write(json.dumps(obj, separators=(",", ":")).encode(ENC) + b"\n")
+
+    async def finish(ticket, resp):
+        try:
+            await loop.run_in_executor(None, journal.wait, ticket)
+            send(resp)
+        except Exception as e:
+            send({"ok": False, "msg": f"SERVER_ERROR:{e}", "id": resp.get('id')})
+
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readuntil(b"\n"), CLIENT_TIMEOUT)
+            except asyncio.IncompleteReadError as e:
+                if e.partial:
+                    raise ConnectionError("connection closed mid-line")
+                break
+            except asyncio.LimitOverrunError:
+                raise LineTooLong(f"line exceeds {MAX_LINE} bytes")
+            except asyncio.TimeoutError:
+                raise socket.timeout("timed out")
+            msg = json.loads(line.decode(ENC))
+            resp, done = process_message(msg, session)
+            ticket = session.pop('commit', 0)
+            if ticket and 'id' in msg:
+                # tagged requests may complete out of order: later requests
+                # are not held back while this one waits for its fsync
+                task = asyncio.ensure_future(finish(ticket, resp))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                continue
+            if ticket:
+                await loop.run_in_executor(None, journal.wait, ticket)
+            send(resp)
+            await writer.drain()
+            if done:
+                break
 
+    except Exception as e:
+        try:
+            send({"ok": False, "msg": f"SERVER_ERROR:{e}"})
+            await writer.drain()
+        except Exception:
+            pass
+    finally:
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        end_session(session)
+        writer.close()
+
+
+def serve_threaded(host, port):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    s.bind((args.host, args.port))
+    s.bind((host, port))
     s.listen(100)
-    print(f"[lobby] listening on {args.host}:{args.port}")
+    print(f"[lobby] listening on {host}:{port} (threaded)")
 
     while True:
         c, addr = s.accept()
         threading.Thread(target=handle_client, args=(c, addr), daemon=True).start()
 
+
+async def serve_asyncio(host, port):
+    server = await asyncio.start_server(handle_client_async, host, port,
+                                        limit=MAX_LINE + 1, backlog=1024,
+                                        reuse_address=True)
+    print(f"[lobby] listening on {host}:{port} (asyncio)")
+    async with server:
+        await server.serve_forever()
+
+
+def positive_int(text):
+    n = int(text)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {text}")
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='0.0.0.0')
+    ap.add_argument('--port', type=int, default=12000)
+    ap.add_argument('--mode', choices=['threaded', 'asyncio'], default='threaded')
+    ap.add_argument('--shards', type=positive_int, default=16)
+    ap.add_argument('--compact-interval', type=float, default=30.0)
+    ap.add_argument('--compact-bytes', type=int, default=1 << 20)
+    args = ap.parse_args()
+
+    init_shards(args.shards)
+    load_persist()
+    threading.Thread(target=compactor_loop, args=(args.compact_interval, args.compact_bytes),
+                     daemon=True).start()
+
+    if args.mode == 'asyncio':
+        asyncio.run(serve_asyncio(args.host, args.port))
+    else:
+        serve_threaded(args.host, args.port)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import socket
+from common import JsonLineSocket
+from connect4 import BitboardConnect4
+from move_sync import MoveMirror
+from solver import Solver, best_move
+
+
+def connect(host, port):
+    s = socket.create_connection((host, port))
+    js = JsonLineSocket(s)
+    s.settimeout(None)  # the opponent may think for longer than the 30s default
+    return js
+
+
+def create_match(js, username, mode='move'):
+    js.send({"type":"CREATE","username":username,"mode":mode})
+    resp = js.recv()
+    if not resp or resp.get('type') != 'CREATED':
+        raise ConnectionError(f'create failed: {resp}')
+    return resp['match']
+
+
+def join_match(js, match_id, username, spectate=False, mode='move'):
+    js.send({"type":"JOIN","match":match_id,"username":username,"spectate":spectate,"mode":mode})
+    resp = js.recv()
+    if not resp or resp.get('type') != 'JOINED':
+        raise ConnectionError(f'join failed: {resp}')
+    return resp['as']
+
+
+def choose_move(me, gstate, solver, bot, think_time):
+    if bot:
+        col = best_move(BitboardConnect4.from_state(gstate), think_time, solver)
+        print(f'[{me}] 電腦下第 {col} 列')
+        return col
+    while True:
+        ans = input(f'[{me}] 請輸入欄位(0-6，h=提示)：').strip()
+        if ans.lower() == 'h':
+            print(f"💡 建議下第 {best_move(BitboardConnect4.from_state(gstate), think_time, solver)} 列")
+            continue
+        try:
+            return int(ans)
+        except ValueError:
+            print('❌ 非法輸入')
+
+
+def play_hosted(js, me, match_id, lobby=None, bot=False, think_time=1.0):
+    solver = Solver()
+    mirror = MoveMirror()
+    gstate = None
+    try:
+        while True:
+            msg = js.recv()
+            if msg is None:
+                print(f'[{me}] 連線中斷')
+                break
+            t = msg.get('type')
+            if msg.get('match') != match_id:
+                continue
+            if t == 'MV':
+                if not mirror.apply(msg):
+                    js.send({"type":"RESYNC","match":match_id})
+                    continue
+                msg = {"type":"STATE", "match":match_id, **mirror.state()}
+                t = 'STATE'
+            elif t == 'STATE':
+                mirror.reset(msg)
+            if t == 'STATE':
+                gstate = msg
+                print("\n".join(" ".join(str(c) for c in row) for row in msg['board']))
+                print(f"輪到：{msg['turn']}  勝負：{msg['winner']}")
+                winner = msg['winner']
+                if winner:
+                    if lobby is not None and winner in ('A', 'B') and me in ('A', 'B'):
+                        lobby.report({"wins": 1} if winner == me else {"loses": 1})
+                    break
+                if msg['turn'] == me:
+                    js.send({"type":"MOVE","match":match_id,"col":choose_move(me, gstate, solver, bot, think_time)})
+            elif t == 'HELLO':
+                print(f"[{me}] 對手 {msg.get('username')} 已加入")
+            elif t == 'ERROR':
+                print(f'[{me}] 錯誤：', msg.get('msg'))
+                if gstate and gstate['turn'] == me and not gstate['winner']:
+                    js.send({"type":"MOVE","match":match_id,"col":choose_move(me, gstate, solver, bot, think_time)})
+            elif t == 'BYE':
+                print(f'[{me}] 對手離開')
+                break
+    finally:
+        js.sock.close()
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import itertools
+import json
+from common import ENC, MAX_LINE
+from connect4 import BitboardConnect4
+from move_sync import move_msg, state_msg
+
+
+class Match:
+    def __init__(self, match_id):
+        self.id = match_id
+        self.game = BitboardConnect4()
+        self.players = {}   # 'A'/'B' -> Peer
+        self.names = {}
+        self.spectators = set()
+
+    def state(self):
+        return state_msg(self.game, match=self.id)
+
+    def broadcast(self, obj):
+        for peer in list(self.players.values()) + list(self.spectators):
+            peer.send(obj)
+
+    def broadcast_move(self):
+        # encode each form at most once however many peers watch
+        full = delta = None
+        for peer in list(self.players.values()) + list(self.spectators):
+            if self.id in peer.move_mode:
+                delta = delta or move_msg(self.game, match=self.id)
+                peer.send(delta)
+                if self.game.winner is not None:
+                    # the match closes now, so a diverged peer cannot RESYNC
+                    full = full or self.state()
+                    peer.send(full)
+            else:
+                full = full or self.state()
+                peer.send(full)
+
+
+class Peer:
+    def __init__(self, writer):
+        self.writer = writer
+        self.roles = {}     # match id -> 'A'/'B'/'S'
+        self.move_mode = set()  # match ids this peer wants MV deltas for
+
+    def send(self, obj):
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(obj, separators=(",", ":")).encode(ENC) + b"\n")
+
+
+class MatchHost:
+    def __init__(self):
+        self.matches = {}
+        self.ids = itertools.count(1)
+
+    def handle(self, peer, msg):
+        t = msg.get('type')
+        if t == 'CREATE':
+            m = Match(next(self.ids))
+            self.matches[m.id] = m
+            m.players['A'] = peer
+            m.names['A'] = msg.get('username')
+            peer.roles[m.id] = 'A'
+            if msg.get('mode') == 'move':
+                peer.move_mode.add(m.id)
+            return {"type": "CREATED", "match": m.id, "as": "A"}
+
+        if t == 'LIST':
+            return {"type": "MATCHES", "matches": [
+                {"match": m.id, "players": m.names, "open": 'B' not in m.players,
+                 "spectators": len(m.spectators)}
+                for m in self.matches.values()]}
+
+        m = self.matches.get(msg.get('match'))
+        if m is None:
+            return {"type": "ERROR", "msg": "NO_SUCH_MATCH", "match": msg.get('match')}
+
+        if t == 'JOIN':
+            if m.id in peer.roles:
+                return {"type": "ERROR", "msg": "ALREADY_JOINED", "match": m.id}
+            if msg.get('mode') == 'move':
+                peer.move_mode.add(m.id)
+            if msg.get('spectate'):
+                m.spectators.add(peer)
+                peer.roles[m.id] = 'S'
+                peer.send({"type": "JOINED", "match": m.id, "as": "S"})
+                return m.state()
+            if 'B' in m.players:
+                return {"type": "ERROR", "msg": "MATCH_FULL", "match": m.id}
+            m.players['B'] = peer
+            m.names['B'] = msg.get('username')
+            peer.roles[m.id] = 'B'
+            peer.send({"type": "JOINED", "match": m.id, "as": "B", "opponent": m.names.get('A')})
+            m.players['A'].send({"type": "HELLO", "match": m.id, "as": "B", "username": m.names['B']})
+            m.broadcast(m.state())
+            return None
+
+        if t == 'MOVE':
+            role = peer.roles.get(m.id)
+            if role not in ('A', 'B'):
+                return {"type": "ERROR", "msg": "NOT_A_PLAYER", "match": m.id}
+            if 'B' not in m.players:
+                return {"type": "ERROR", "msg": "WAITING_FOR_OPPONENT", "match": m.id}
+            if m.game.turn != role or m.game.winner is not None:
+                return {"type": "ERROR", "msg": "NOT_YOUR_TURN", "match": m.id}
+            try:
+                m.game.drop(int(msg.get('col')))
+            except (TypeError, ValueError) as e:
+                return {"type": "ERROR", "msg": str(e), "match": m.id}
+            m.broadcast_move()
+            if m.game.winner is not None:
+                self.close_match(m, None)
+            return None
+
+        if t == 'RESYNC':
+            if m.id not in peer.roles:
+                return {"type": "ERROR", "msg": "NOT_IN_MATCH", "match": m.id}
+            return m.state()
+
+        if t == 'LEAVE':
+            self.leave(peer, m)
+            return {"type": "BYE", "match": m.id}
+
+        return {"type": "ERROR", "msg": "UNKNOWN_TYPE"}
+
+    def leave(self, peer, m):
+        role = peer.roles.pop(m.id, None)
+        peer.move_mode.discard(m.id)
+        if role == 'S':
+            m.spectators.discard(peer)
+        elif role is not None:
+            self.close_match(m, {"type": "BYE", "match": m.id, "reason": "OPPONENT_LEFT"}, skip=peer)
+
+    def close_match(self, m, bye, skip=None):
+        self.matches.pop(m.id, None)
+        for peer in list(m.players.values()) + list(m.spectators):
+            peer.roles.pop(m.id, None)
+            peer.move_mode.discard(m.id)
+            if bye is not None and peer is not skip:
+                peer.send(bye)
+
+    async def serve_peer(self, reader, writer):
+        peer = Peer(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                try:
+                    msg = json.loads(line.decode(ENC))
+                except ValueError:
+                    peer.send({"type": "ERROR", "msg": "BAD_JSON"})
+                    continue
+                resp = self.handle(peer, msg)
+                if resp is not None:
+                    peer.send(resp)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for match_id in list(peer.roles):
+                m = self.matches.get(match_id)
+                if m is not None:
+                    self.leave(peer, m)
+            writer.close()
+
+
+async def serve(host, port):
+    mh = MatchHost()
+    server = await asyncio.start_server(mh.serve_peer, host, port, limit=MAX_LINE + 1,
+                                        backlog=1024, reuse_address=True)
+    print(f"[match] listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='0.0.0.0')
+    ap.add_argument('--port', type=int, default=13000)
+    args = ap.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+from connect4 import BitboardConnect4
+
+HASH_EVERY = 8
+
+
+def state_msg(g, **extra):
+    return {"type":"STATE", **extra, **g.copy_state(), "seq": len(g.moves)}
+
+
+def move_msg(g, **extra):
+    # only the column travels; every HASH_EVERY moves (and at the end) the
+    # sender adds its position hash so the receiver can detect divergence
+    seq = len(g.moves)
+    msg = {"type":"MV", **extra, "col": g.moves[-1], "seq": seq}
+    if seq % HASH_EVERY == 0 or g.winner is not None:
+        msg['hash'] = f"{g.hash:016x}"
+    return msg
+
+
+class MoveMirror:
+    def __init__(self):
+        self.g = BitboardConnect4()
+
+    def reset(self, state):
+        self.g = BitboardConnect4.from_state(state)
+
+    def apply(self, msg):
+        g = self.g
+        if msg.get('seq') != len(g.moves) + 1:
+            return False
+        try:
+            g.drop(int(msg['col']))
+        except (KeyError, TypeError, ValueError):
+            return False
+        if 'hash' in msg and msg['hash'] != f"{g.hash:016x}":
+            return False
+        return True
+
+    def state(self):
+        return self.g.copy_state()
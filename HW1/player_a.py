@@ -1,59 +1,101 @@
 import argparse
 import json
+import selectors
 import socket
 import threading
 import time
 from common import JsonLineSocket, send_json_line, recv_json_line, bind_with_retry
-from connect4 import Connect4
+from connect4 import BitboardConnect4
+from lobby_client import LobbyClient
+import match_client
+from move_sync import move_msg, state_msg
+from reliable_udp import ReliableUDP
+from solver import Solver, best_move
 from time import sleep
 ENC = 'utf-8'
 
-class LobbyClient:
-    def __init__(self, host, port, username, password):
-        self.addr = (host, port)
-        self.u = username
-        self.p = password
 
-    def _rpc(self, obj):
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect(self.addr)
-        js = JsonLineSocket(s)
-        js.send(obj)
-        resp = js.recv()
-        s.close()
-        return resp
+def iter_discover(hosts, pstart, pend, timeout=0.5, broadcast=False):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    probe = json.dumps({"type":"DISCOVER"}).encode(ENC)
+    targets = []
+    for h in hosts:
+        try:
+            ip = socket.gethostbyname(h)
+        except OSError:
+            continue
+        targets.extend((ip, port) for port in range(pstart, pend+1))
+    if broadcast:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        targets.extend(('<broadcast>', port) for port in range(pstart, pend+1))
 
-    def register(self):
-        return self._rpc({"type":"REGISTER","username":self.u,"password":self.p})
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+    deadline = time.monotonic() + timeout
+    seen = set()
+    pending = iter(targets)
+    nxt = next(pending, None)
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            for key, events in sel.select(remaining):
+                if events & selectors.EVENT_WRITE:
+                    while nxt is not None:
+                        try:
+                            sock.sendto(probe, nxt)
+                        except BlockingIOError:
+                            break
+                        except OSError:
+                            pass
+                        nxt = next(pending, None)
+                    if nxt is None:
+                        sel.modify(sock, selectors.EVENT_READ)
+                if events & selectors.EVENT_READ:
+                    while True:
+                        try:
+                            data, addr = sock.recvfrom(1024)
+                        except BlockingIOError:
+                            break
+                        except OSError:
+                            # ICMP port unreachable from a closed probe port
+                            continue
+                        try:
+                            msg = json.loads(data.decode(ENC))
+                        except Exception:
+                            continue
+                        if msg.get('type') == 'HERE' and msg.get('status') == 'waiting' and addr not in seen:
+                            seen.add(addr)
+                            yield {**msg, 'addr': addr}
+    finally:
+        sel.close()
+        sock.close()
 
-    def login(self):
-        return self._rpc({"type":"LOGIN","username":self.u,"password":self.p})
 
-    def report(self, delta):
-        return self._rpc({"type":"REPORT","username":self.u,"delta":delta})
+def udp_discover(hosts, pstart, pend, timeout=0.5, broadcast=False):
+    return list(iter_discover(hosts, pstart, pend, timeout, broadcast))
 
-    def logout(self):
-        return self._rpc({"type":"LOGOUT","username":self.u})
 
+def send_invite(ru, addr, username, reply_timeout=15):
+    # None when B never acknowledged or answered
+    mid = ru.send({"type":"INVITE","from":username}, addr)
+    if not ru.wait(mid):
+        return None
+    deadline = time.monotonic() + reply_timeout
+    while True:
+        msg, _ = ru.recv(deadline - time.monotonic())
+        if msg is None:
+            return None
+        if msg.get('type') == 'INVITE_REPLY':
+            return msg.get('accept') is True
 
-def udp_discover(hosts, pstart, pend, timeout=0.2):
-    results = []
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.settimeout(timeout)
-    probe = json.dumps({"type":"DISCOVER"}).encode(ENC)
-    for h in hosts:
-        for port in range(pstart, pend+1):
-            try:
-                sock.sendto(probe, (h, port))
-                data, addr = sock.recvfrom(1024)
-                msg = json.loads(data.decode(ENC))
-                if msg.get('type') == 'HERE' and msg.get('status') == 'waiting':
-                    results.append({**msg, 'addr': addr})
-            except socket.timeout:
-                pass
-            except Exception:
-                pass
-    return results
+
+def send_tcp_info(ru, addr, info):
+    mid = ru.send({"type":"TCP_INFO", **info}, addr)
+    if not ru.wait(mid):
+        print('[A] TCP_INFO 未確認送達，繼續等待對方連線')
 
 
 def display_board(game_state):
@@ -76,26 +118,39 @@ def display_board(game_state):
         print("⏳ 等待對手下棋...")
     print("="*29)
 
-def game_server_thread(listen_sock, a_username, lobby: LobbyClient):
+def game_server_thread(listen_sock, a_username, lobby: LobbyClient, bot=False, think_time=1.0):
     conn, addr = listen_sock.accept()
     js = JsonLineSocket(conn)
-    g = Connect4()
+    g = BitboardConnect4()
+    solver = Solver()
 
-    js.send({"type":"HELLO","as":"A","game":"connect4"})
+    js.send({"type":"HELLO","as":"A","game":"connect4","modes":["state","move"]})
     peer = js.recv()
+    move_mode = bool(peer) and peer.get('mode') == 'move'
     
     print(f"🎮 遊戲開始！您是 Player A (棋子顯示為 '1')")
     print(f"🤝 對手 Player B 已連接 (棋子顯示為 '2')")
 
     try:
-        broadcast = lambda: js.send({"type":"STATE", **g.copy_state()})
+        def broadcast():
+            if move_mode and g.moves:
+                js.send(move_msg(g))
+            else:
+                js.send(state_msg(g))
     
         display_board(g.copy_state())
         broadcast()
         
         while g.winner is None:
             if g.turn == 'A':
-                col = input("[A] 請輸入欄位(0-6)：").strip()
+                if bot:
+                    col = best_move(g, think_time, solver)
+                    print(f"🤖 電腦在第 {col} 列下棋")
+                else:
+                    col = input("[A] 請輸入欄位(0-6，h=提示)：").strip()
+                    if col.lower() == 'h':
+                        print(f"💡 建議下第 {best_move(g, think_time, solver)} 列")
+                        continue
                 try:
                     col = int(col)
                     g.drop(col)
@@ -118,8 +173,12 @@ def game_server_thread(listen_sock, a_username, lobby: LobbyClient):
                         broadcast()
                     except Exception as e:
                         js.send({"type":"ERROR","msg":str(e)})
+                elif msg.get('type') == 'RESYNC':
+                    js.send(state_msg(g))
                 else:
                     js.send({"type":"ERROR","msg":"EXPECT_MOVE"})
+        if g.winner and move_mode:
+            js.send(state_msg(g))  # lets a diverged peer settle the result
         if g.winner:
             print("\n🎉 遊戲結束！")
             display_board(g.copy_state())
@@ -145,10 +204,15 @@ def main():
     ap.add_argument('--lobby-port', type=int, default=12000)
     ap.add_argument('--username', required=True)
     ap.add_argument('--password', required=True)
-    ap.add_argument('--scan-hosts', nargs='+', required=True)
+    ap.add_argument('--scan-hosts', nargs='+', default=[])
     ap.add_argument('--scan-port-start', type=int, default=18000)
     ap.add_argument('--scan-port-end', type=int, default=18020)
     ap.add_argument('--game-tcp-port', type=int, default=19000)
+    ap.add_argument('--discover-timeout', type=float, default=0.5)
+    ap.add_argument('--broadcast', action='store_true')
+    ap.add_argument('--match-host', default=None, help='host:port of a shared match_host.py')
+    ap.add_argument('--bot', action='store_true')
+    ap.add_argument('--think-time', type=float, default=1.0)
     args = ap.parse_args()
 
     lobby = LobbyClient(args.lobby_host, args.lobby_port, args.username, args.password)
@@ -161,24 +225,44 @@ def main():
         return
     print('[A] login success')
 
-    avail = udp_discover(args.scan_hosts, args.scan_port_start, args.scan_port_end)
-    if not avail:
+    target = None
+    for p in lobby.list_waiting():
+        if p.get('host') and p.get('udp_port'):
+            target = {**p, 'addr': (p['host'], p['udp_port'])}
+            break
+    if target is None and (args.scan_hosts or args.broadcast):
+        target = next(iter_discover(args.scan_hosts, args.scan_port_start, args.scan_port_end,
+                                    args.discover_timeout, args.broadcast), None)
+    if target is None:
         print('[A] 找不到等待中的玩家B')
         lobby.logout()
         return
-    target = avail[0]
     print('[A] 選擇目標：', target)
 
     us = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    us.settimeout(15)
-    us.sendto(json.dumps({"type":"INVITE","from":args.username}).encode(ENC), target['addr'])
-    data, _ = us.recvfrom(1024)
-    rep = json.loads(data.decode(ENC))
-    
-    if not (rep.get('type') == 'INVITE_REPLY' and rep.get('accept') is True):
+    ru = ReliableUDP(us)
+    accepted = send_invite(ru, target['addr'], args.username)
+    if accepted is None:
+        print('[A] 對方沒有回應')
+        lobby.logout()
+        return
+    if not accepted:
         print('[A] 被拒絕或異常')
         lobby.logout()
         return
+
+    if args.match_host:
+        mhost, _, mport = args.match_host.rpartition(':')
+        js = match_client.connect(mhost, int(mport))
+        match_id = match_client.create_match(js, args.username)
+        print(f'[A] 在對戰主機 {args.match_host} 建立對局 #{match_id}')
+        send_tcp_info(ru, target['addr'], {"host":mhost, "port":int(mport), "match":match_id})
+        try:
+            match_client.play_hosted(js, 'A', match_id, lobby, args.bot, args.think_time)
+        finally:
+            lobby.logout()
+        return
+
     lsock, bound_port = bind_with_retry('0.0.0.0', args.game_tcp_port)
     print(f'[A] 遊戲伺服器綁定於 TCP {bound_port}')
 
@@ -194,10 +278,10 @@ def main():
         external_ip = socket.gethostbyname(socket.gethostname())
         print(f'[A] 使用 IP: {external_ip}')
     
-    us.sendto(json.dumps({"type":"TCP_INFO","host":external_ip,
-                          "port": bound_port}).encode(ENC), target['addr'])
+    send_tcp_info(ru, target['addr'], {"host":external_ip, "port":bound_port})
 
-    t = threading.Thread(target=game_server_thread, args=(lsock, args.username, lobby), daemon=True)
+    t = threading.Thread(target=game_server_thread, args=(lsock, args.username, lobby, args.bot, args.think_time),
+                         daemon=True)
     t.start()
 
     t.join()
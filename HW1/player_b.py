@@ -3,82 +3,74 @@ import json
 import socket
 import threading
 from common import JsonLineSocket
-from connect4 import Connect4
+from connect4 import BitboardConnect4
+from lobby_client import LobbyClient
+import match_client
+from move_sync import MoveMirror
+from reliable_udp import ReliableUDP
+from solver import Solver, best_move
 
 ENC = 'utf-8'
 
-class LobbyClient:
-    def __init__(self, host, port, username, password):
-        self.addr = (host, port)
-        self.u = username
-        self.p = password
-
-    def _rpc(self, obj):
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect(self.addr)
-        js = JsonLineSocket(s)
-        js.send(obj)
-        resp = js.recv()
-        s.close()
-        return resp
-
-    def register(self):
-        return self._rpc({"type":"REGISTER","username":self.u,"password":self.p})
-
-    def login(self):
-        return self._rpc({"type":"LOGIN","username":self.u,"password":self.p})
-
-    def report(self, delta):
-        return self._rpc({"type":"REPORT","username":self.u,"delta":delta})
-
-    def logout(self):
-        return self._rpc({"type":"LOGOUT","username":self.u})
 
+def udp_wait_loop(udp_port, auto_accept, sock=None):
+    s = sock
+    if s is None:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(('0.0.0.0', udp_port))
+        print(f'[B] UDP waiting on {udp_port}')
+    ru = ReliableUDP(s)
 
-def udp_wait_loop(udp_port, auto_accept):
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.bind(('0.0.0.0', udp_port))
-    print(f'[B] UDP waiting on {udp_port}')
-
-    tcp_info = None
     inviter = None
 
     while True:
-        data, addr = s.recvfrom(2048)
-        try:
-            msg = json.loads(data.decode(ENC))
-        except Exception:
-            continue
-
+        msg, addr = ru.recv()
         t = msg.get('type')
         if t == 'DISCOVER':
             resp = {"type":"HERE","username":"?","udp_port":udp_port,"status":"waiting"}
-            s.sendto(json.dumps(resp).encode(ENC), addr)
+            ru.sendto_raw(resp, addr)
         elif t == 'INVITE':
             inviter = msg.get('from')
             if auto_accept:
-                s.sendto(json.dumps({"type":"INVITE_REPLY","accept":True}).encode(ENC), addr)
+                accept = True
             else:
                 ans = input(f"收到 {inviter} 邀請，接受？(y/n) ").strip().lower()
-                s.sendto(json.dumps({"type":"INVITE_REPLY","accept": ans.startswith('y')}).encode(ENC), addr)
+                accept = ans.startswith('y')
+            ru.send({"type":"INVITE_REPLY","accept":accept}, addr)
         elif t == 'TCP_INFO':
-            tcp_info = (msg.get('host'), int(msg.get('port')))
+            tcp_info = (msg.get('host'), int(msg.get('port')), msg.get('match'))
+            # answer A's retransmissions in case our ACK got lost
+            threading.Thread(target=ru.linger, args=(10.0,), daemon=True).start()
             return tcp_info, inviter
 
 
-def play_as_client(host, port, lobby: LobbyClient):
+def play_as_client(host, port, lobby: LobbyClient, bot=False, think_time=1.0):
     s = socket.create_connection((host, port))
     js = JsonLineSocket(s)
     hello = js.recv()
-    js.send({"type":"HELLO","as":"B","game":"connect4"})
+    mirror = None
+    if hello and 'move' in hello.get('modes', []):
+        mirror = MoveMirror()
+        js.send({"type":"HELLO","as":"B","game":"connect4","mode":"move"})
+    else:
+        js.send({"type":"HELLO","as":"B","game":"connect4"})
 
     gstate = None
+    solver = Solver()
     try:
         while True:
             msg = js.recv()
             if msg is None:
                 print('[B] 連線中斷')
                 break
+            if msg.get('type') == 'MV' and mirror is not None:
+                if not mirror.apply(msg):
+                    print('[B] 棋盤不同步，要求重送')
+                    js.send({"type":"RESYNC"})
+                    continue
+                msg = {"type":"STATE", **mirror.state()}
+            elif msg.get('type') == 'STATE' and mirror is not None:
+                mirror.reset(msg)
             if msg.get('type') == 'STATE':
                 gstate = msg
                 board = gstate['board']
@@ -93,8 +85,17 @@ def play_as_client(host, port, lobby: LobbyClient):
                         lobby.report({"loses": 1})
                     break
                 if turn == 'B':
+                    if bot:
+                        col = best_move(BitboardConnect4.from_state(gstate), think_time, solver)
+                        print(f'[B] 電腦下第 {col} 列')
+                        js.send({"type":"MOVE","col":col})
+                        continue
                     try:
-                        col = int(input('[B] 請輸入欄位(0-6)：').strip())
+                        ans = input('[B] 請輸入欄位(0-6，h=提示)：').strip()
+                        while ans.lower() == 'h':
+                            hint = best_move(BitboardConnect4.from_state(gstate), think_time, solver)
+                            ans = input(f'[B] 建議第 {hint} 列，請輸入欄位(0-6)：').strip()
+                        col = int(ans)
                         js.send({"type":"MOVE","col":col})
                     except Exception:
                         js.send({"type":"MOVE","col":-1})
@@ -114,6 +115,10 @@ def main():
     ap.add_argument('--password', required=True)
     ap.add_argument('--udp-port', type=int, required=True)
     ap.add_argument('--auto-accept', action='store_true')
+    ap.add_argument('--advertise-host', default=None)
+    ap.add_argument('--advertise-ttl', type=float, default=30.0)
+    ap.add_argument('--bot', action='store_true')
+    ap.add_argument('--think-time', type=float, default=1.0)
     args = ap.parse_args()
 
     lobby = LobbyClient(args.lobby_host, args.lobby_port, args.username, args.password)
@@ -125,11 +130,29 @@ def main():
         print('[B] login fail:', r)
         return
 
+    stop = threading.Event()
+    def refresh_advert():
+        while True:
+            r = lobby.advertise(args.udp_port, host=args.advertise_host, ttl=args.advertise_ttl)
+            if not r.get('ok'):
+                print('[B] advertise fail (UDP discovery only):', r)
+                return
+            if stop.wait(args.advertise_ttl / 2):
+                return
+    threading.Thread(target=refresh_advert, daemon=True).start()
+
     tcp_info, inviter = udp_wait_loop(args.udp_port, args.auto_accept)
+    stop.set()
+    lobby.withdraw()
     print('[B] 接收連線資訊：', tcp_info)
 
     try:
-        play_as_client(tcp_info[0], tcp_info[1], lobby)
+        if tcp_info[2] is not None:
+            js = match_client.connect(tcp_info[0], tcp_info[1])
+            me = match_client.join_match(js, tcp_info[2], args.username)
+            match_client.play_hosted(js, me, tcp_info[2], lobby, args.bot, args.think_time)
+        else:
+            play_as_client(tcp_info[0], tcp_info[1], lobby, args.bot, args.think_time)
     finally:
         lobby.logout()
 
@@ -0,0 +1,157 @@
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from socket import timeout as socket_timeout
+
+ENC = 'utf-8'
+
+
+class ReliableUDP:
+    # send() tags datagrams with a mid and resends with backoff until ACKed;
+    # datagrams without a mid (DISCOVER/HERE) pass through untouched
+    def __init__(self, sock, rto=0.25, max_rto=2.0, retries=6,
+                 max_inflight=64, dedupe_size=1024):
+        self.sock = sock
+        self.rto = rto
+        self.min_rto = 0.05
+        self.max_rto = max_rto
+        self.retries = retries
+        self.max_inflight = max_inflight
+        self.dedupe_size = dedupe_size
+        self.srtt = None
+        self.nonce = os.urandom(4).hex()
+        self.counter = 0
+        self.inflight = OrderedDict()  # mid -> [data, addr, deadline, tries, rto, sent_at]
+        self.done = OrderedDict()      # mid -> delivered?, for wait()
+        self.seen = OrderedDict()      # (addr, mid) -> None
+        self.backlog = deque()
+        self.retransmits = 0
+
+    def sendto_raw(self, msg, addr):
+        self.sock.sendto(json.dumps(msg).encode(ENC), addr)
+
+    def send(self, msg, addr):
+        if len(self.inflight) >= self.max_inflight:
+            raise RuntimeError('too many unacknowledged datagrams')
+        self.counter += 1
+        mid = f'{self.nonce}-{self.counter}'
+        data = json.dumps({**msg, 'mid': mid}).encode(ENC)
+        now = time.monotonic()
+        self.inflight[mid] = [data, addr, now + self.rto, 0, self.rto, now]
+        self.sock.sendto(data, addr)
+        return mid
+
+    def _on_ack(self, mid):
+        ent = self.inflight.pop(mid, None)
+        if ent is None:
+            return
+        if ent[3] == 0:
+            # Karn: only sample the RTT of datagrams that were never resent
+            sample = time.monotonic() - ent[5]
+            self.srtt = sample if self.srtt is None else 0.875 * self.srtt + 0.125 * sample
+            self.rto = min(self.max_rto, max(self.min_rto, 4 * self.srtt))
+        self._finish(mid, True)
+
+    def _finish(self, mid, ok):
+        self.done[mid] = ok
+        if len(self.done) > self.dedupe_size:
+            self.done.popitem(last=False)
+
+    def _retransmit(self):
+        now = time.monotonic()
+        for mid, ent in list(self.inflight.items()):
+            if ent[2] > now:
+                continue
+            if ent[3] >= self.retries:
+                del self.inflight[mid]
+                self._finish(mid, False)
+                continue
+            ent[3] += 1
+            ent[4] = min(self.max_rto, ent[4] * 2)
+            ent[2] = now + ent[4]
+            self.retransmits += 1
+            try:
+                self.sock.sendto(ent[0], ent[1])
+            except OSError:
+                pass
+
+    def _next_timer(self):
+        if not self.inflight:
+            return None
+        return min(ent[2] for ent in self.inflight.values())
+
+    def _pump(self, timeout):
+        # resend what is due, then handle at most one datagram
+        self._retransmit()
+        wait = self._next_timer()
+        if wait is not None:
+            wait = max(0.0, wait - time.monotonic())
+            timeout = wait if timeout is None else min(wait, timeout)
+        self.sock.settimeout(timeout)
+        try:
+            data, addr = self.sock.recvfrom(2048)
+        except (socket_timeout, BlockingIOError):
+            return None
+        except ConnectionError:
+            # ICMP port unreachable surfacing on the socket
+            return None
+        try:
+            msg = json.loads(data.decode(ENC))
+        except Exception:
+            return None
+        if not isinstance(msg, dict):
+            return None
+        if msg.get('type') == 'ACK':
+            if isinstance(msg.get('ack'), str):
+                self._on_ack(msg['ack'])
+            return None
+        mid = msg.pop('mid', None)
+        if mid is not None:
+            if not isinstance(mid, str):
+                return None
+            try:
+                self.sendto_raw({"type": "ACK", "ack": mid}, addr)
+            except OSError:
+                pass  # the peer resends and we ack the duplicate
+            key = (addr, mid)
+            if key in self.seen:
+                return None
+            self.seen[key] = None
+            if len(self.seen) > self.dedupe_size:
+                self.seen.popitem(last=False)
+        return msg, addr
+
+    def recv(self, timeout=None):
+        if self.backlog:
+            return self.backlog.popleft()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return None, None
+            got = self._pump(left)
+            if got is not None:
+                return got
+
+    def wait(self, mid, timeout=None):
+        # messages that arrive meanwhile are kept for the next recv()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._retransmit()
+            if mid not in self.inflight:
+                break
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return False
+            got = self._pump(left)
+            if got is not None:
+                self.backlog.append(got)
+        return self.done.get(mid, False)
+
+    def linger(self, seconds):
+        # keep re-acking so the peer's last retransmissions still succeed
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            self.recv(end - time.monotonic())
+
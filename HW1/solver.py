@@ -0,0 +1,167 @@
+import time
+from connect4 import ROWS, COLS, H, ZOBRIST, ZOBRIST_TURN, has_four
+
+ORDER = sorted(range(COLS), key=lambda c: abs(c - COLS // 2))
+CELLS = ROWS * COLS
+WIN = 1000  # win scores are WIN - stones on board, so faster wins score higher
+CENTER = ((1 << ROWS) - 1) << (COLS // 2 * H)
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    def __init__(self, size=1 << 20):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+
+    def get(self, key):
+        e = self.slots[key % self.size]
+        if e is not None and e[0] == key:
+            return e
+        return None
+
+    def put(self, key, depth, flag, score, move):
+        i = key % self.size
+        old = self.slots[i]
+        # depth-preferred, but entries from an older search are always replaced
+        if old is None or old[0] == key or old[5] != self.generation or depth >= old[1]:
+            self.slots[i] = (key, depth, flag, score, move, self.generation)
+
+
+class Solver:
+    def __init__(self, tt_size=1 << 20):
+        self.tt = TranspositionTable(tt_size)
+        self.nodes = 0
+
+    def search(self, game, time_budget=1.0, max_depth=CELLS):
+        if game.winner is not None:
+            raise ValueError('game finished')
+        self.tt.generation += 1
+        self.nodes = 0
+        self.deadline = time.perf_counter() + time_budget
+        self.bb = list(game.bitboards)
+        self.heights = list(game.heights)
+        self.side = 0 if game.turn == 'A' else 1
+        self.hash = game.hash
+        self.count = len(game.moves)
+
+        t0 = time.perf_counter()
+        empty = CELLS - self.count
+        best = {'col': next(c for c in ORDER if game.can_play(c)), 'score': 0, 'depth': 0, 'solved': False}
+        for depth in range(1, min(max_depth, empty) + 1):
+            try:
+                col, score = self._root(depth, best['col'])
+            except SearchTimeout:
+                break
+            solved = depth >= empty or abs(score) > WIN - CELLS - 1
+            best = {'col': col, 'score': score, 'depth': depth, 'solved': solved}
+            if solved:
+                break
+        best['nodes'] = self.nodes
+        best['elapsed'] = time.perf_counter() - t0
+        return best
+
+    def _root(self, depth, first):
+        order = [first] + [c for c in ORDER if c != first]
+        alpha, beta = -WIN, WIN
+        best_col, best = None, -WIN
+        for col in order:
+            if not self._can_play(col):
+                continue
+            self._play(col)
+            score = -self._negamax(depth - 1, -beta, -alpha)
+            self._unplay(col)
+            if score > best:
+                best, best_col = score, col
+                alpha = max(alpha, score)
+        return best_col, best
+
+    def _can_play(self, col):
+        return self.heights[col] < col * H + ROWS
+
+    def _play(self, col):
+        pos = self.heights[col]
+        self.heights[col] = pos + 1
+        self.bb[self.side] |= 1 << pos
+        self.hash ^= ZOBRIST[self.side][pos] ^ ZOBRIST_TURN
+        self.side ^= 1
+        self.count += 1
+
+    def _unplay(self, col):
+        self.side ^= 1
+        self.count -= 1
+        pos = self.heights[col] - 1
+        self.heights[col] = pos
+        self.bb[self.side] &= ~(1 << pos)
+        self.hash ^= ZOBRIST[self.side][pos] ^ ZOBRIST_TURN
+
+    def _negamax(self, depth, alpha, beta):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        # the opponent just moved; did it connect four?
+        if has_four(self.bb[self.side ^ 1]):
+            return -(WIN - self.count)
+        if self.count == CELLS:
+            return 0
+        if depth == 0:
+            me, opp = self.bb[self.side], self.bb[self.side ^ 1]
+            return bin(me & CENTER).count('1') - bin(opp & CENTER).count('1')
+
+        me = self.bb[self.side]
+        heights = self.heights
+        for col in ORDER:
+            pos = heights[col]
+            if pos < col * H + ROWS and has_four(me | (1 << pos)):
+                return WIN - (self.count + 1)
+
+        alpha_orig = alpha
+        key = self.hash
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                flag, score = entry[2], entry[3]
+                if flag == EXACT:
+                    return score
+                if flag == LOWER and score > alpha:
+                    alpha = score
+                elif flag == UPPER and score < beta:
+                    beta = score
+                if alpha >= beta:
+                    return score
+
+        order = ORDER if tt_move is None else [tt_move] + [c for c in ORDER if c != tt_move]
+        best, best_col = -WIN, None
+        for col in order:
+            if heights[col] >= col * H + ROWS:
+                continue
+            self._play(col)
+            score = -self._negamax(depth - 1, -beta, -alpha)
+            self._unplay(col)
+            if score > best:
+                best, best_col = score, col
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.put(key, depth, flag, best, best_col)
+        return best
+
+
+def best_move(game, time_budget=1.0, solver=None):
+    return (solver or Solver()).search(game, time_budget)['col']
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+import lobby_server
+
+
+class CompactionFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        lobby_server.init_shards(4)
+        lobby_server.load_persist()
+
+    def tearDown(self):
+        lobby_server.journal.close()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def register(self, u):
+        session = {}
+        resp, _ = lobby_server.process_message(
+            {"type": "REGISTER", "username": u, "password": "pw-" + u}, session)
+        self.assertTrue(resp['ok'])
+        lobby_server.journal.wait(session.get('commit', 0))
+
+    def report(self, u, wins):
+        session = {}
+        resp, _ = lobby_server.process_message(
+            {"type": "REPORT", "username": u, "delta": {"wins": wins}}, session)
+        self.assertTrue(resp['ok'])
+        lobby_server.journal.wait(session.get('commit', 0))
+
+    def test_restart_replays_records_of_failed_compactions(self):
+        def failing_save(snap_users, snap_stats):
+            raise OSError("disk full")
+
+        save = lobby_server.save_persist
+        lobby_server.save_persist = failing_save
+        try:
+            self.register('alice')
+            self.report('alice', 2)
+            with self.assertRaises(OSError):
+                lobby_server.compact()
+            self.register('bob')
+            self.report('bob', 1)
+            with self.assertRaises(OSError):
+                lobby_server.compact()
+            self.register('carol')
+        finally:
+            lobby_server.save_persist = save
+
+        # restart from what is on disk
+        lobby_server.journal.close()
+        lobby_server.init_shards(4)
+        lobby_server.load_persist()
+        users, stats = lobby_server.snapshot()
+        self.assertEqual(users, {'alice': 'pw-alice', 'bob': 'pw-bob', 'carol': 'pw-carol'})
+        self.assertEqual(stats['alice']['wins'], 2)
+        self.assertEqual(stats['bob']['wins'], 1)
+        self.assertFalse(os.path.exists(lobby_server.JOURNAL_FILE + '.old'))
+
+    def test_leaderboard_follows_reports_after_restart(self):
+        self.register('alice')
+        self.report('alice', 1)
+        lobby_server.journal.close()
+        lobby_server.init_shards(4)
+        lobby_server.load_persist()
+        self.report('alice', 2)
+        top = lobby_server.leaderboard.top(1)
+        self.assertEqual(top[0]['username'], 'alice')
+        self.assertEqual(top[0]['wins'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
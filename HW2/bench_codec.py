@@ -0,0 +1,48 @@
+"""Bytes per message and encode/decode cost of the JSON and binary codecs.
+
+    python3 bench_codec.py --number 20000
+"""
+import argparse
+import json
+import timeit
+
+from protocol import CODECS
+from bench_protocol import snapshot_message
+
+
+def messages():
+    return [
+        ('INPUT', {'type': 'INPUT', 'userId': 12, 'action': 'HARD_DROP'}),
+        ('SNAPSHOT', snapshot_message()),
+        ('GAME_END', {'type': 'GAME_END', 'winner': 12, 'results': [
+            {'userId': 12, 'score': 4200, 'lines': 31, 'maxCombo': 0, 'gameOver': False},
+            {'userId': 13, 'score': 1800, 'lines': 12, 'maxCombo': 0, 'gameOver': True}]}),
+    ]
+
+
+def decoder(name):
+    if name == 'json':
+        return lambda body: json.loads(str(body, 'utf-8'))
+    return CODECS[name].decode
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--number', type=int, default=20000)
+    args = ap.parse_args()
+
+    print(f"{'message':<10} {'codec':<7} {'bytes':>6} {'encode us':>10} {'decode us':>10}")
+    for kind, msg in messages():
+        for name, codec in CODECS.items():
+            body = codec.encode(msg)
+            decode = decoder(name)
+            assert decode(memoryview(body)) == msg, (kind, name)
+            enc = min(timeit.repeat(lambda: codec.encode(msg), number=args.number, repeat=3))
+            view = memoryview(body)
+            dec = min(timeit.repeat(lambda: decode(view), number=args.number, repeat=3))
+            print(f'{kind:<10} {name:<7} {len(body):>6} '
+                  f'{enc / args.number * 1e6:>10.2f} {dec / args.number * 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
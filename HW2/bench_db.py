@@ -0,0 +1,121 @@
+"""Ops/sec of DatabaseServer.process_request for the lobby's request mix.
+
+Runs the same mix against the pooled WAL connections and against the old
+connect-per-request behaviour, each on a fresh database file. Requests go
+straight to process_request from several threads, so the numbers measure
+SQLite work and not the network.
+
+    python3 bench_db.py --threads 8 --seconds 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from db_server import DatabaseServer
+
+
+class ConnectPerRequest(DatabaseServer):
+    """The original behaviour: open, run one statement, commit, close."""
+
+    def __init__(self, **kwargs):
+        super().__init__(commit_window=None, **kwargs)
+
+    def connection(self):
+        return sqlite3.connect(self.db_file)
+
+    def release(self, conn):
+        conn.close()
+
+
+def seed(server, users=200, rooms=100, logs=500):
+    for i in range(users):
+        server.process_request({'collection': 'User', 'action': 'create', 'data': {
+            'name': f'user{i}', 'email': f'user{i}@test.com', 'passwordHash': 'x' * 64}})
+    for i in range(rooms):
+        server.process_request({'collection': 'Room', 'action': 'create', 'data': {
+            'name': f'room{i}', 'hostUserId': i % users + 1, 'visibility': 'public',
+            'inviteList': []}})
+    for i in range(logs):
+        server.process_request({'collection': 'GameLog', 'action': 'create', 'data': {
+            'matchId': f'{i}', 'roomId': i % rooms + 1, 'users': [1, 2],
+            'startAt': '2024-01-01T00:00:00', 'endAt': '2024-01-01T00:05:00',
+            'results': [{'userId': 1, 'score': 100}]}})
+
+
+def lobby_mix(rng, users, rooms):
+    """One lobby action's worth of DB requests (what lobby_server.py sends)."""
+    r = rng.random()
+    room_id = rng.randint(1, rooms)
+    if r < 0.30:   # list_rooms
+        return [{'collection': 'Room', 'action': 'query', 'data': {}}]
+    if r < 0.45:   # login
+        name = f'user{rng.randrange(users)}'
+        return [{'collection': 'User', 'action': 'query', 'data': {'name': name}},
+                {'collection': 'User', 'action': 'update', 'data': {
+                    'id': rng.randint(1, users), 'updates': {'lastLoginAt': time.time()}}}]
+    if r < 0.65:   # join_room / invite_user
+        return [{'collection': 'Room', 'action': 'read', 'data': {'id': room_id}}]
+    if r < 0.75:   # create_room
+        return [{'collection': 'Room', 'action': 'create', 'data': {
+            'name': 'bench', 'hostUserId': 1, 'visibility': 'public', 'inviteList': []}}]
+    if r < 0.85:   # start_game
+        return [{'collection': 'Room', 'action': 'read', 'data': {'id': room_id}},
+                {'collection': 'Room', 'action': 'update', 'data': {
+                    'id': room_id, 'updates': {'status': 'playing'}}}]
+    if r < 0.95:   # game_ended
+        return [{'collection': 'Room', 'action': 'update', 'data': {
+                    'id': room_id, 'updates': {'status': 'idle'}}},
+                {'collection': 'GameLog', 'action': 'create', 'data': {
+                    'matchId': 'bench', 'roomId': room_id, 'users': [1, 2],
+                    'startAt': '2024-01-01T00:00:00', 'results': []}}]
+    # register
+    n = rng.getrandbits(48)
+    return [{'collection': 'User', 'action': 'create', 'data': {
+        'name': f'bench{n}', 'email': f'bench{n}@test.com', 'passwordHash': 'x' * 64}}]
+
+
+def run(server_cls, threads, seconds, users=200, rooms=100):
+    with tempfile.TemporaryDirectory() as tmp:
+        server = server_cls(db_file=os.path.join(tmp, 'bench.db'))
+        seed(server, users, rooms)
+        counts = [0] * threads
+        errors = [0] * threads
+        stop = time.monotonic() + seconds
+
+        def worker(i):
+            rng = random.Random(i)
+            while time.monotonic() < stop:
+                for req in lobby_mix(rng, users, rooms):
+                    if not server.process_request(req).get('success'):
+                        errors[i] += 1
+                    counts[i] += 1
+
+        ts = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in ts:
+            t.start()
+        for t in ts:
+            t.join()
+        elapsed = time.perf_counter() - start
+        server.close_connections()
+        return sum(counts) / elapsed, sum(errors)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--threads', type=int, default=8)
+    ap.add_argument('--seconds', type=float, default=5.0)
+    args = ap.parse_args()
+
+    print(f"{'mode':<20} {'ops/s':>10} {'errors':>7}")
+    for name, cls in (('connect-per-request', ConnectPerRequest), ('pooled WAL', DatabaseServer)):
+        rate, errors = run(cls, args.threads, args.seconds)
+        print(f'{name:<20} {rate:>10.0f} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Connection bursts against the DB server: asyncio front end vs. thread per client.
+
+Opens --idle connections that never send anything, then starts --clients
+clients at once; each connects and sends --requests lobby reads over its own
+connection. "threads" counts the server process's threads at the end of the
+burst, before the idle connections are closed.
+
+    python3 bench_db_server.py --clients 500 --idle 500 --requests 20
+"""
+import argparse
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from db_server import DatabaseServer
+from protocol import send_message, recv_message, ProtocolError
+
+
+class ThreadPerClient(DatabaseServer):
+    """The original front end: listen(5), one daemon thread per connection."""
+
+    def start(self):
+        self.running = True
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind((self.host, self.port))
+        server_socket.listen(5)
+        server_socket.settimeout(1.0)
+        while self.running:
+            try:
+                client_socket, addr = server_socket.accept()
+            except socket.timeout:
+                continue
+            print(f"[DB] New connection from {addr}")
+            threading.Thread(target=self.serve_client, args=(client_socket,), daemon=True).start()
+        server_socket.close()
+
+    def serve_client(self, client_socket):
+        try:
+            while True:
+                send_message(client_socket, self.process_request(recv_message(client_socket)))
+        except (ConnectionError, ProtocolError, OSError):
+            pass
+        finally:
+            client_socket.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run(server_cls, clients, idle, requests):
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        server = server_cls(host='127.0.0.1', port=port, db_file=os.path.join(tmp, 'bench.db'))
+        for i in range(100):
+            server.process_request({'collection': 'Room', 'action': 'create', 'data': {
+                'name': f'room{i}', 'hostUserId': 1, 'visibility': 'public'}})
+        threading.Thread(target=server.start, daemon=True).start()
+        time.sleep(0.5)
+
+        idle_socks = [socket.create_connection(('127.0.0.1', port)) for _ in range(idle)]
+        latencies, failures = [], [0]
+        lock = threading.Lock()
+        go = threading.Event()
+
+        def client(i):
+            go.wait()
+            try:
+                t0 = time.perf_counter()
+                with socket.create_connection(('127.0.0.1', port), timeout=10) as s:
+                    connected = time.perf_counter() - t0
+                    for j in range(requests):
+                        t1 = time.perf_counter()
+                        send_message(s, {'collection': 'Room', 'action': 'read',
+                                         'data': {'id': (i + j) % 100 + 1}})
+                        if not recv_message(s).get('success'):
+                            raise ProtocolError('request failed')
+                        with lock:
+                            latencies.append(time.perf_counter() - t1 + (connected if j == 0 else 0))
+            except (OSError, ConnectionError, ProtocolError):
+                with lock:
+                    failures[0] += 1
+
+        ts = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+        for t in ts:
+            t.start()
+        start = time.perf_counter()
+        go.set()
+        for t in ts:
+            t.join()
+        elapsed = time.perf_counter() - start
+        # client threads have exited; what is left is the server's
+        threads = threading.active_count() - 1
+        for s in idle_socks:
+            s.close()
+        server.running = False
+
+    lat = sorted(x * 1000 for x in latencies)
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] if lat else float('nan')
+    p50 = statistics.median(lat) if lat else float('nan')
+    return len(lat) / elapsed, p50, p99, failures[0], threads
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--clients', type=int, default=500)
+    ap.add_argument('--idle', type=int, default=500)
+    ap.add_argument('--requests', type=int, default=20)
+    args = ap.parse_args()
+
+    # the servers log every request to stdout; keep the table readable
+    out, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    print(f"{'front end':<18} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>9} {'failed':>7} {'threads':>8}",
+          file=out)
+    for name, cls in (('thread per client', ThreadPerClient), ('asyncio', DatabaseServer)):
+        rate, p50, p99, failed, threads = run(cls, args.clients, args.idle, args.requests)
+        print(f'{name:<18} {rate:>8.0f} {p50:>8.2f} {p99:>9.1f} {failed:>7} {threads:>8}', file=out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Write throughput vs. latency of the group-commit writer for several windows.
+
+Each thread sends the lobby's write requests (room status updates, game log
+inserts, login timestamps) straight to process_request and times each one.
+"per-request" is commit_window=None: every write commits on its own pooled
+connection and competes for SQLite's write lock. --synchronous FULL makes
+every commit fsync the WAL, which is where grouping pays off most.
+
+    python3 bench_group_commit.py --threads 16 --seconds 3 --windows 0 0.001 0.005
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from bench_db import seed
+from db_server import DatabaseServer
+
+
+def write_mix(rng, users, rooms):
+    r = rng.random()
+    if r < 0.4:
+        return {'collection': 'Room', 'action': 'update', 'data': {
+            'id': rng.randint(1, rooms), 'updates': {'status': rng.choice(('idle', 'playing'))}}}
+    if r < 0.7:
+        return {'collection': 'GameLog', 'action': 'create', 'data': {
+            'matchId': 'bench', 'roomId': rng.randint(1, rooms), 'users': [1, 2],
+            'startAt': '2024-01-01T00:00:00', 'results': []}}
+    return {'collection': 'User', 'action': 'update', 'data': {
+        'id': rng.randint(1, users), 'updates': {'lastLoginAt': time.time()}}}
+
+
+def run(window, threads, seconds, synchronous, max_ops, users=200, rooms=100):
+    class Server(DatabaseServer):
+        def open_connection(self, readonly=False):
+            conn = super().open_connection(readonly)
+            conn.execute(f'PRAGMA synchronous={synchronous}')
+            return conn
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = Server(db_file=os.path.join(tmp, 'bench.db'), commit_window=window,
+                        commit_max_ops=max_ops)
+        seed(server, users, rooms, logs=0)
+        latencies = [[] for _ in range(threads)]
+        errors = [0] * threads
+        stop = time.monotonic() + seconds
+
+        def worker(i):
+            rng = random.Random(i)
+            while time.monotonic() < stop:
+                req = write_mix(rng, users, rooms)
+                t0 = time.perf_counter()
+                if not server.process_request(req).get('success'):
+                    errors[i] += 1
+                latencies[i].append(time.perf_counter() - t0)
+
+        ts = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in ts:
+            t.start()
+        for t in ts:
+            t.join()
+        elapsed = time.perf_counter() - start
+        commits, writes = server.group_commits, server.group_writes
+        server.close_connections()
+
+    lat = sorted(x * 1000 for xs in latencies for x in xs)
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+    group = writes / commits if commits else 1.0
+    return len(lat) / elapsed, statistics.median(lat), p99, group, sum(errors)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--threads', type=int, default=16)
+    ap.add_argument('--seconds', type=float, default=3.0)
+    ap.add_argument('--windows', type=float, nargs='+', default=[0, 0.001, 0.002, 0.005, 0.01])
+    ap.add_argument('--max-ops', type=int, default=64)
+    ap.add_argument('--synchronous', choices=('NORMAL', 'FULL'), default='NORMAL')
+    args = ap.parse_args()
+
+    print(f"{'window':<12} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'ops/commit':>10} {'errors':>7}")
+    for window in [None] + args.windows:
+        rate, p50, p99, group, errors = run(window, args.threads, args.seconds,
+                                            args.synchronous, args.max_ops)
+        name = 'per-request' if window is None else f'{window * 1000:g} ms'
+        print(f'{name:<12} {rate:>9.0f} {p50:>8.2f} {p99:>8.1f} {group:>10.1f} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Throughput of protocol.send_message/recv_message over TCP loopback.
+
+Streams SNAPSHOT-sized and ~60KB frames from one thread to another and
+compares the current framing with the old slice-and-concatenate version.
+The query case is a ~1.4MB result set that the old framing refused to send;
+"wire" is what actually crosses the socket after compression and framing.
+"compressed" is a connection that negotiated compression in HELLO/WELCOME.
+
+    python3 bench_protocol.py --count 20000
+"""
+import argparse
+import json
+import socket
+import struct
+import threading
+import time
+
+import protocol
+from protocol import send_message, recv_message, set_compression
+from tetris_logic import TetrisGame
+
+
+def legacy_send_message(sock, data):
+    message = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    header = struct.pack('!I', len(message))
+    data = header + message
+    total_sent = 0
+    while total_sent < len(data):
+        total_sent += sock.send(data[total_sent:])
+
+
+def legacy_recv_all(sock, length):
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("Socket connection broken")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def legacy_recv_message(sock):
+    length = struct.unpack('!I', legacy_recv_all(sock, 4))[0]
+    return json.loads(legacy_recv_all(sock, length).decode('utf-8'))
+
+
+def snapshot_message():
+    game = TetrisGame(seed=7)
+    for _ in range(30):
+        game.hard_drop()
+        if game.game_over:
+            break
+    state = game.get_state()
+    return {
+        'type': 'SNAPSHOT', 'userId': 1, 'username': 'player1', 'role': 'P1',
+        'boardRLE': game.compress_board(), 'active': state['current'],
+        'hold': state['hold'], 'next': state['next'], 'score': state['score'],
+        'lines': state['lines'], 'level': state['level'],
+        'gameOver': state['gameOver'], 'timestamp': time.time(),
+    }
+
+
+def large_message():
+    rows = [{'id': i, 'name': f'room-{i}', 'hostUserId': i % 97, 'visibility': 'public',
+             'status': 'idle', 'createdAt': '2024-01-01T00:00:00'} for i in range(600)]
+    msg = {'success': True, 'data': rows}
+    while len(json.dumps(msg, ensure_ascii=False).encode('utf-8')) > 60 * 1024:
+        rows.pop()
+    return msg
+
+
+def query_message():
+    rows = [{'id': i, 'name': f'room-{i}', 'hostUserId': i % 97, 'visibility': 'public',
+             'status': 'idle', 'createdAt': '2024-01-01T00:00:00'} for i in range(12000)]
+    return {'success': True, 'data': rows}
+
+
+def wire_size(msg, compress):
+    a, b = socket.socketpair()
+    set_compression(a, compress)
+    t = threading.Thread(target=lambda: (send_message(a, msg), a.close()), daemon=True)
+    t.start()
+    total = 0
+    while True:
+        chunk = b.recv(1 << 16)
+        if not chunk:
+            break
+        total += len(chunk)
+    t.join()
+    b.close()
+    return total
+
+
+def tcp_pair():
+    ls = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    ls.bind(('127.0.0.1', 0))
+    ls.listen(1)
+    a = socket.create_connection(ls.getsockname())
+    b, _ = ls.accept()
+    ls.close()
+    for s in (a, b):
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return a, b
+
+
+def run(send, recv, msg, count, compress):
+    a, b = tcp_pair()
+    set_compression(a, compress)
+    size = len(json.dumps(msg, ensure_ascii=False).encode('utf-8')) + 4
+    def writer():
+        for _ in range(count):
+            send(a, msg)
+
+    t = threading.Thread(target=writer, daemon=True)
+    start = time.perf_counter()
+    t.start()
+    for _ in range(count):
+        recv(b)
+    elapsed = time.perf_counter() - start
+    t.join()
+    a.close()
+    b.close()
+    return count / elapsed, size * count / elapsed / 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=20000)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    cases = [('snapshot', snapshot_message(), args.count),
+             ('60KB', large_message(), max(1, args.count // 20)),
+             ('query', query_message(), max(1, args.count // 400))]
+    impls = [('legacy', legacy_send_message, legacy_recv_message, False),
+             ('current', send_message, recv_message, False),
+             ('compressed', send_message, recv_message, True)]
+    print(f"{'message':<10} {'impl':<10} {'bytes':>8} {'wire':>8} {'msg/s':>10} {'MB/s':>8}")
+    for name, msg, count in cases:
+        size = len(json.dumps(msg, ensure_ascii=False).encode('utf-8'))
+        for impl, send, recv, compress in impls:
+            if impl == 'legacy' and size > protocol.MAX_MESSAGE_LENGTH:
+                print(f'{name:<10} {impl:<10} {size:>8} {"-":>8} {"too large":>10}')
+                continue
+            wire = size + 4 if impl == 'legacy' else wire_size(msg, compress)
+            rate, mbs = max(run(send, recv, msg, count, compress) for _ in range(args.repeat))
+            print(f'{name:<10} {impl:<10} {size:>8} {wire:>8} {rate:>10.0f} {mbs:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,29 +2,135 @@
 Database Server - 獨立的資料庫服務
 使用 TCP + JSON API，底層使用 SQLite
 """
-import socket
+import asyncio
+import queue
 import sqlite3
 import threading
 import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from protocol import send_message, recv_message, ProtocolError
+from protocol import read_message, write_message, ProtocolError
 import hashlib
 
 DB_HOST = '0.0.0.0'
 DB_PORT = 10001
 DB_FILE = 'game_database.db'
+# prepared statements kept per connection (sqlite3's statement cache)
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = 8
+# threads running SQLite work for the asyncio front end
+WORKERS = 16
+# requests allowed to wait for a worker; past this, connections stop being read
+MAX_PENDING = 64
+LISTEN_BACKLOG = 1024
+# group commit: the writer thread waits up to COMMIT_WINDOW seconds (or until
+# COMMIT_MAX_OPS writes are queued) and commits them in one transaction; with 0
+# it takes whatever queued up while the previous commit was running
+COMMIT_WINDOW = 0
+COMMIT_MAX_OPS = 64
+
+# schema migrations, applied in order; PRAGMA user_version records the last one
+MIGRATIONS = [
+    # 1: secondary indexes for the lobby's query paths (name/email are UNIQUE already)
+    [
+        'CREATE INDEX IF NOT EXISTS idx_room_status ON Room (status, id)',
+        'CREATE INDEX IF NOT EXISTS idx_room_visibility ON Room (visibility, id)',
+        'CREATE INDEX IF NOT EXISTS idx_gamelog_room ON GameLog (roomId, id)',
+        'ANALYZE',
+    ],
+]
+
+# query filters per collection; only the first one present in the request is used
+QUERY_FILTERS = {
+    'User': ('name', 'email'),
+    'Room': ('status', 'visibility'),
+    'GameLog': ('roomId',),
+}
+
+COLUMNS = {
+    'User': ('id', 'name', 'email', 'passwordHash', 'createdAt', 'lastLoginAt'),
+    'Room': ('id', 'name', 'hostUserId', 'visibility', 'inviteList', 'status', 'createdAt'),
+    'GameLog': ('id', 'matchId', 'roomId', 'users', 'startAt', 'endAt', 'results'),
+}
+JSON_COLUMNS = {'inviteList', 'users', 'results'}
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 100
 
 
 class DatabaseServer:
-    def __init__(self, host=DB_HOST, port=DB_PORT):
+    def __init__(self, host=DB_HOST, port=DB_PORT, db_file=DB_FILE, pool_size=POOL_SIZE,
+                 commit_window=COMMIT_WINDOW, commit_max_ops=COMMIT_MAX_OPS,
+                 workers=WORKERS, max_pending=MAX_PENDING):
         self.host = host
         self.port = port
+        self.db_file = db_file
         self.running = False
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pool = queue.LifoQueue()
+        self.pool_lock = threading.Lock()
+        self.pool_size = pool_size
+        self.pool_created = 0
+        # commit_window=None: no writer thread, every write commits on its own
+        self.commit_window = commit_window
+        self.commit_max_ops = commit_max_ops
+        self.write_queue = queue.Queue()
+        self.writer = None
+        self.group_commits = 0
+        self.group_writes = 0
         self.init_database()
+        if commit_window is not None:
+            self.writer = threading.Thread(target=self.writer_loop, daemon=True)
+            self.writer.start()
         
+    def open_connection(self, readonly=False):
+        conn = sqlite3.connect(self.db_file, timeout=10, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if readonly:
+            conn.execute('PRAGMA query_only=ON')
+        return conn
+    
+    def connection(self):
+        """從連線池取一條長連線（WAL、synchronous=NORMAL、快取 prepared statements）
+
+        有 writer thread 時連線池只負責讀取，連線設為 query_only。
+        """
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self.pool_lock:
+            create = self.pool_created < self.pool_size
+            if create:
+                self.pool_created += 1
+        if create:
+            return self.open_connection(readonly=self.writer is not None)
+        return self.pool.get()
+    
+    def release(self, conn):
+        # the connection is reused, so never hand it back inside a transaction
+        if conn.in_transaction:
+            conn.rollback()
+        self.pool.put(conn)
+    
+    def close_connections(self):
+        if self.writer is not None:
+            self.write_queue.put(None)
+            self.writer.join()
+            self.writer = None
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
+    
     def init_database(self):
         """初始化資料庫結構"""
-        conn = sqlite3.connect(DB_FILE)
+        conn = sqlite3.connect(self.db_file)
         cursor = conn.cursor()
         
         # User 
@@ -68,56 +174,87 @@ class DatabaseServer:
         ''')
         
         conn.commit()
+        self.migrate(conn)
         conn.close()
-        print(f"[DB] Database initialized: {DB_FILE}")
+        print(f"[DB] Database initialized: {self.db_file}")
+    
+    def migrate(self, conn):
+        """套用尚未執行的 schema migration（可重複執行）"""
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+            print(f"[DB] Applied migration {number}")
     
     def start(self):
         self.running = True
-        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server_socket.bind((self.host, self.port))
-        server_socket.listen(5)
-        
-        print(f"[DB Server] Listening on {self.host}:{self.port}")
-        
         try:
-            while self.running:
-                try:
-                    server_socket.settimeout(1.0)
-                    client_socket, addr = server_socket.accept()
-                    print(f"[DB] New connection from {addr}")
-                    
-                    thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, addr)
-                    )
-                    thread.daemon = True
-                    thread.start()
-                except socket.timeout:
-                    continue
+            asyncio.run(self.serve())
         except KeyboardInterrupt:
             print("\n[DB Server] Shutting down...")
         finally:
-            server_socket.close()
+            self.running = False
+            self.close_connections()
+    
+    async def serve(self):
+        """asyncio 收發 frame，SQLite 工作交給固定大小的 executor"""
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='db-worker')
+        # running + waiting requests; when it is used up, handlers stop reading
+        # their sockets and TCP flow control pushes back on the clients
+        self.slots = asyncio.Semaphore(self.workers + self.max_pending)
+        server = await asyncio.start_server(self.handle_client, self.host, self.port,
+                                            backlog=LISTEN_BACKLOG)
+        print(f"[DB Server] Listening on {self.host}:{self.port}")
+        
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
     
-    def handle_client(self, client_socket, addr):
+    async def run_blocking(self, func, *args):
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+    
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        print(f"[DB] New connection from {addr}")
         try:
             while True:
-                request = recv_message(client_socket)
+                request = await read_message(reader)
                 print(f"[DB] Request from {addr}: {request.get('action')} on {request.get('collection')}")
                 
-                response = self.process_request(request)
+                response = await self.run_blocking(self.process_request, request)
                 
-                send_message(client_socket, response)
+                if isinstance(response, dict):
+                    await write_message(writer, response)
+                else:
+                    await self.send_stream(writer, response)
                 
         except (ConnectionError, ProtocolError) as e:
             print(f"[DB] Connection error from {addr}: {e}")
         except Exception as e:
             print(f"[DB] Error handling client {addr}: {e}")
         finally:
-            client_socket.close()
+            writer.close()
             print(f"[DB] Connection closed: {addr}")
     
+    async def send_stream(self, writer, batches):
+        # each batch runs its query on a worker; write_message waits for the
+        # client to drain before the next one is fetched
+        while True:
+            try:
+                batch = await self.run_blocking(next, batches, None)
+            except Exception as e:
+                # the client is waiting for more=False, so end the stream with the error
+                await write_message(writer, {'success': False, 'error': str(e), 'more': False})
+                return
+            if batch is None:
+                return
+            await write_message(writer, batch)
+    
     def process_request(self, request):
         collection = request.get('collection')
         action = request.get('action')
@@ -134,189 +271,325 @@ class DatabaseServer:
                 return self.delete(collection, data)
             elif action == 'query':
                 return self.query(collection, data)
+            elif action == 'explain':
+                return self.explain(collection, data)
+            elif action == 'batch':
+                return self.batch(data)
             else:
                 return {'success': False, 'error': f'Unknown action: {action}'}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def create(self, collection, data):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+    def execute(self, op, collection, data):
+        """單一操作：借一條連線執行 op，成功才 commit"""
+        conn = self.connection()
         
         try:
-            if collection == 'User':
-                cursor.execute('''
-                    INSERT INTO User (name, email, passwordHash, createdAt)
-                    VALUES (?, ?, ?, ?)
-                ''', (data['name'], data['email'], data['passwordHash'], 
-                      datetime.now().isoformat()))
-                user_id = cursor.lastrowid
+            result = op(conn.cursor(), collection, data)
+            if result.get('success') and conn.in_transaction:
                 conn.commit()
-                return {'success': True, 'id': user_id}
-                
-            elif collection == 'Room':
-                cursor.execute('''
-                    INSERT INTO Room (name, hostUserId, visibility, inviteList, status, createdAt)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (data['name'], data['hostUserId'], data['visibility'],
-                      json.dumps(data.get('inviteList', [])), 'idle',
-                      datetime.now().isoformat()))
-                room_id = cursor.lastrowid
-                conn.commit()
-                return {'success': True, 'id': room_id}
-                
-            elif collection == 'GameLog':
-                cursor.execute('''
-                    INSERT INTO GameLog (matchId, roomId, users, startAt, endAt, results)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (data['matchId'], data['roomId'], json.dumps(data['users']),
-                      data['startAt'], data.get('endAt'), json.dumps(data.get('results', []))))
-                log_id = cursor.lastrowid
-                conn.commit()
-                return {'success': True, 'id': log_id}
-            else:
-                return {'success': False, 'error': f'Unknown collection: {collection}'}
+            return result
         finally:
-            conn.close()
+            self.release(conn)
+    
+    def write(self, action, collection, data):
+        """寫入：有 writer thread 就排進 group commit，否則自己 commit"""
+        if self.writer is None:
+            return self.execute(self.handlers[action], collection, data)
+        results, _ = self.submit_write([{'collection': collection, 'action': action, 'data': data}])
+        return results[0]
+    
+    def create(self, collection, data):
+        return self.write('create', collection, data)
     
     def read(self, collection, data):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        return self.execute(self.read_op, collection, data)
+    
+    def update(self, collection, data):
+        return self.write('update', collection, data)
+    
+    def delete(self, collection, data):
+        return self.write('delete', collection, data)
+    
+    @property
+    def handlers(self):
+        return {'create': self.create_op, 'read': self.read_op,
+                'update': self.update_op, 'delete': self.delete_op}
+    
+    def create_op(self, cursor, collection, data):
+        if collection == 'User':
+            cursor.execute('''
+                INSERT INTO User (name, email, passwordHash, createdAt)
+                VALUES (?, ?, ?, ?)
+            ''', (data['name'], data['email'], data['passwordHash'], 
+                  datetime.now().isoformat()))
+            return {'success': True, 'id': cursor.lastrowid}
+            
+        elif collection == 'Room':
+            cursor.execute('''
+                INSERT INTO Room (name, hostUserId, visibility, inviteList, status, createdAt)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (data['name'], data['hostUserId'], data['visibility'],
+                  json.dumps(data.get('inviteList', [])), 'idle',
+                  datetime.now().isoformat()))
+            return {'success': True, 'id': cursor.lastrowid}
+            
+        elif collection == 'GameLog':
+            cursor.execute('''
+                INSERT INTO GameLog (matchId, roomId, users, startAt, endAt, results)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (data['matchId'], data['roomId'], json.dumps(data['users']),
+                  data['startAt'], data.get('endAt'), json.dumps(data.get('results', []))))
+            return {'success': True, 'id': cursor.lastrowid}
+        else:
+            return {'success': False, 'error': f'Unknown collection: {collection}'}
+    
+    def read_op(self, cursor, collection, data):
+        if collection not in ('User', 'Room'):
+            return {'success': False, 'error': f'Unknown collection: {collection}'}
+        columns = COLUMNS[collection]
+        cursor.execute(f'SELECT {", ".join(columns)} FROM {collection} WHERE id = ?',
+                       (data.get('id'),))
+        row = cursor.fetchone()
+        if row:
+            return {'success': True, 'data': self.row_to_dict(columns, row)}
+        return {'success': False, 'error': f'{collection} not found'}
+    
+    def check_columns(self, collection, names):
+        unknown = [n for n in names if n not in COLUMNS[collection]]
+        if unknown:
+            raise ValueError(f'Unknown fields: {unknown}')
+    
+    def update_op(self, cursor, collection, data):
+        if collection not in COLUMNS:
+            return {'success': False, 'error': f'Unknown collection: {collection}'}
+        record_id = data.get('id')
+        updates = dict(data.get('updates', {}))
+        # optional extra equality conditions, e.g. {"hostUserId": 3}
+        where = data.get('where', {})
+        self.check_columns(collection, list(updates) + list(where))
+        for k in updates.keys() & JSON_COLUMNS:
+            updates[k] = json.dumps(updates[k])
         
-        try:
-            record_id = data.get('id')
-            if collection == 'User':
-                cursor.execute('SELECT * FROM User WHERE id = ?', (record_id,))
-                row = cursor.fetchone()
-                if row:
-                    return {
-                        'success': True,
-                        'data': {
-                            'id': row[0], 'name': row[1], 'email': row[2],
-                            'passwordHash': row[3], 'createdAt': row[4], 'lastLoginAt': row[5]
-                        }
-                    }
-                else:
-                    return {'success': False, 'error': 'User not found'}
-                    
-            elif collection == 'Room':
-                cursor.execute('SELECT * FROM Room WHERE id = ?', (record_id,))
-                row = cursor.fetchone()
-                if row:
-                    return {
-                        'success': True,
-                        'data': {
-                            'id': row[0], 'name': row[1], 'hostUserId': row[2],
-                            'visibility': row[3], 'inviteList': json.loads(row[4]),
-                            'status': row[5], 'createdAt': row[6]
-                        }
-                    }
+        set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
+        where_clause = ''.join(f' AND {k} = ?' for k in where)
+        values = list(updates.values()) + [record_id] + list(where.values())
+        cursor.execute(f'UPDATE {collection} SET {set_clause} WHERE id = ?{where_clause}', values)
+        return {'success': True, 'modified': cursor.rowcount}
+    
+    def delete_op(self, cursor, collection, data):
+        if collection not in COLUMNS:
+            return {'success': False, 'error': f'Unknown collection: {collection}'}
+        cursor.execute(f'DELETE FROM {collection} WHERE id = ?', (data.get('id'),))
+        return {'success': True, 'deleted': cursor.rowcount}
+    
+    def batch(self, data):
+        """在同一個 transaction 內依序執行多個 create/read/update/delete
+
+        任一操作失敗（或 expect 的筆數不符）就整批 rollback。
+        """
+        ops = data.get('ops', [])
+        handlers = self.handlers
+        for i, op in enumerate(ops):
+            if op.get('action') not in handlers:
+                return {'success': False, 'error': f"op {i}: Unknown action: {op.get('action')}",
+                        'failedOp': i}
+        writes = any(op['action'] != 'read' for op in ops)
+        if writes and self.writer is not None:
+            results, failed = self.submit_write(ops)
+        else:
+            conn = self.connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE' if writes else 'BEGIN')
+                results, failed = self.run_ops(cursor, ops)
+                if failed is None:
+                    conn.commit()
                 else:
-                    return {'success': False, 'error': 'Room not found'}
-            else:
-                return {'success': False, 'error': f'Unknown collection: {collection}'}
-        finally:
-            conn.close()
+                    conn.rollback()
+            finally:
+                self.release(conn)
+        if failed is not None:
+            return {'success': False, 'error': f"op {failed}: {results[-1].get('error')}",
+                    'failedOp': failed, 'results': results}
+        return {'success': True, 'results': results}
     
-    def update(self, collection, data):
-        conn = sqlite3.connect(DB_FILE)
+    def run_ops(self, cursor, ops):
+        """在目前的 transaction 內依序執行 ops，回傳 (results, 失敗的 op index 或 None)"""
+        handlers = self.handlers
+        results = []
+        for i, op in enumerate(ops):
+            try:
+                result = handlers[op['action']](cursor, op.get('collection'), op.get('data', {}))
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            expect = op.get('expect')
+            if result.get('success') and expect is not None:
+                count = result.get('modified', result.get('deleted'))
+                if count != expect:
+                    result = {'success': False, 'matched': count,
+                              'error': f'expected {expect} rows, matched {count}'}
+            results.append(result)
+            if not result.get('success'):
+                return results, i
+        return results, None
+    
+    def submit_write(self, ops):
+        """把一組 ops 交給 writer thread，等它所在的那次 commit 完成"""
+        future = Future()
+        self.write_queue.put((ops, future))
+        return future.result()
+    
+    def writer_loop(self):
+        """唯一的寫入 thread：收集 commit_window 秒內（最多 commit_max_ops 個）的寫入一起 commit"""
+        conn = self.open_connection()
+        stopping = False
+        while not stopping:
+            job = self.write_queue.get()
+            if job is None:
+                break
+            jobs = [job]
+            deadline = time.monotonic() + self.commit_window
+            while len(jobs) < self.commit_max_ops:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        job = self.write_queue.get(timeout=timeout)
+                    else:
+                        job = self.write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                jobs.append(job)
+            self.commit_group(conn, jobs)
+        conn.close()
+    
+    def commit_group(self, conn, jobs):
+        # each job runs in its own savepoint, so a failed one is undone
+        # without touching the others in the same transaction
         cursor = conn.cursor()
-        
+        outcomes = []
         try:
-            record_id = data.get('id')
-            updates = data.get('updates', {})
-            
-            if collection == 'User':
-                set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
-                values = list(updates.values()) + [record_id]
-                cursor.execute(f'UPDATE User SET {set_clause} WHERE id = ?', values)
-            elif collection == 'Room':
-                if 'inviteList' in updates:
-                    updates['inviteList'] = json.dumps(updates['inviteList'])
-                set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
-                values = list(updates.values()) + [record_id]
-                cursor.execute(f'UPDATE Room SET {set_clause} WHERE id = ?', values)
-            elif collection == 'GameLog':
-                if 'users' in updates:
-                    updates['users'] = json.dumps(updates['users'])
-                if 'results' in updates:
-                    updates['results'] = json.dumps(updates['results'])
-                set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
-                values = list(updates.values()) + [record_id]
-                cursor.execute(f'UPDATE GameLog SET {set_clause} WHERE id = ?', values)
-            else:
-                return {'success': False, 'error': f'Unknown collection: {collection}'}
-            
+            cursor.execute('BEGIN IMMEDIATE')
+            for ops, _ in jobs:
+                cursor.execute('SAVEPOINT job')
+                results, failed = self.run_ops(cursor, ops)
+                if failed is not None:
+                    cursor.execute('ROLLBACK TO job')
+                cursor.execute('RELEASE job')
+                outcomes.append((results, failed))
             conn.commit()
-            return {'success': True, 'modified': cursor.rowcount}
-        finally:
-            conn.close()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, future in jobs:
+                future.set_exception(e)
+            return
+        self.group_commits += 1
+        self.group_writes += len(jobs)
+        for (_, future), outcome in zip(jobs, outcomes):
+            future.set_result(outcome)
     
-    def delete(self, collection, data):
-        conn = sqlite3.connect(DB_FILE)
+    def build_query(self, collection, data):
+        """依 data 組出 SELECT：篩選、欄位投影、以 id 做 keyset 分頁"""
+        if collection not in QUERY_FILTERS:
+            raise ValueError(f'Unknown collection: {collection}')
+        columns = COLUMNS[collection]
+        fields = data.get('fields')
+        if fields:
+            unknown = [f for f in fields if f not in columns]
+            if unknown:
+                raise ValueError(f'Unknown fields: {unknown}')
+            # id is always returned, it is the pagination key
+            columns = ('id',) + tuple(f for f in fields if f != 'id')
+        where, params = [], []
+        for field in QUERY_FILTERS[collection]:
+            if field in data:
+                where.append(f'{field} = ?')
+                params.append(data[field])
+                break
+        if data.get('after') is not None:
+            where.append('id > ?')
+            params.append(int(data['after']))
+        sql = f'SELECT {", ".join(columns)} FROM {collection}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if data.get('limit') is not None or data.get('after') is not None:
+            sql += ' ORDER BY id'
+        if data.get('limit') is not None:
+            # one extra row tells us whether there is a next page
+            sql += ' LIMIT ?'
+            params.append(self.page_size(data['limit']) + 1)
+        return sql, tuple(params), columns
+    
+    def row_to_dict(self, columns, r):
+        return {c: (json.loads(v) if v else []) if c in JSON_COLUMNS else v
+                for c, v in zip(columns, r)}
+    
+    def query(self, collection, data):
+        if collection not in QUERY_FILTERS:
+            return {'success': False, 'error': f'Unknown collection: {collection}'}
+        if data.get('stream'):
+            # normalized here so a bad value fails the request, not the stream
+            batch = self.page_size(data.get('batchSize', STREAM_BATCH_SIZE))
+            limit = None if data.get('limit') is None else self.page_size(data['limit'])
+            self.build_query(collection, {**data, 'limit': batch})
+            return self.stream_query(collection, data, batch, limit)
+        sql, params, columns = self.build_query(collection, data)
+        conn = self.connection()
         cursor = conn.cursor()
         
         try:
-            record_id = data.get('id')
-            cursor.execute(f'DELETE FROM {collection} WHERE id = ?', (record_id,))
-            conn.commit()
-            return {'success': True, 'deleted': cursor.rowcount}
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
         finally:
-            conn.close()
+            self.release(conn)
+        response = {'success': True}
+        if data.get('limit') is not None:
+            page_size = self.page_size(data['limit'])
+            more = len(rows) > page_size
+            rows = rows[:page_size]
+            response['next'] = rows[-1][0] if more else None
+        response['data'] = [self.row_to_dict(columns, r) for r in rows]
+        return response
     
-    def query(self, collection, data):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+    def page_size(self, value):
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    
+    def stream_query(self, collection, data, batch, remaining):
+        """串流模式：每批 batchSize 筆各用一個 frame 送出，最後一批 more=False
+
+        每批都是一次獨立的 keyset 查詢，送資料給慢的 client 時不會佔住連線池。
+        """
+        page = {k: v for k, v in data.items() if k not in ('stream', 'batchSize')}
+        while True:
+            if remaining is not None and remaining <= 0:
+                yield {'success': True, 'data': [], 'more': False}
+                return
+            size = batch if remaining is None else min(batch, remaining)
+            result = self.query(collection, {**page, 'limit': size})
+            if remaining is not None:
+                remaining -= len(result['data'])
+            more = result['next'] is not None and remaining != 0
+            yield {'success': True, 'data': result['data'], 'more': more}
+            if not more:
+                return
+            page['after'] = result['next']
+    
+    def explain(self, collection, data):
+        """回傳 query 會使用的 SQL 與 SQLite 查詢計畫（確認是否有用到索引）"""
+        if collection not in QUERY_FILTERS:
+            return {'success': False, 'error': f'Unknown collection: {collection}'}
+        sql, params, _ = self.build_query(collection, data)
+        conn = self.connection()
         
         try:
-            if collection == 'User':
-                if 'name' in data:
-                    cursor.execute('SELECT * FROM User WHERE name = ?', (data['name'],))
-                elif 'email' in data:
-                    cursor.execute('SELECT * FROM User WHERE email = ?', (data['email'],))
-                else:
-                    cursor.execute('SELECT * FROM User')
-                
-                rows = cursor.fetchall()
-                users = [{
-                    'id': r[0], 'name': r[1], 'email': r[2],
-                    'passwordHash': r[3], 'createdAt': r[4], 'lastLoginAt': r[5]
-                } for r in rows]
-                return {'success': True, 'data': users}
-                
-            elif collection == 'Room':
-                if 'status' in data:
-                    cursor.execute('SELECT * FROM Room WHERE status = ?', (data['status'],))
-                elif 'visibility' in data:
-                    cursor.execute('SELECT * FROM Room WHERE visibility = ?', (data['visibility'],))
-                else:
-                    cursor.execute('SELECT * FROM Room')
-                
-                rows = cursor.fetchall()
-                rooms = [{
-                    'id': r[0], 'name': r[1], 'hostUserId': r[2],
-                    'visibility': r[3], 'inviteList': json.loads(r[4]),
-                    'status': r[5], 'createdAt': r[6]
-                } for r in rows]
-                return {'success': True, 'data': rooms}
-                
-            elif collection == 'GameLog':
-                if 'roomId' in data:
-                    cursor.execute('SELECT * FROM GameLog WHERE roomId = ?', (data['roomId'],))
-                else:
-                    cursor.execute('SELECT * FROM GameLog')
-                
-                rows = cursor.fetchall()
-                logs = [{
-                    'id': r[0], 'matchId': r[1], 'roomId': r[2],
-                    'users': json.loads(r[3]), 'startAt': r[4],
-                    'endAt': r[5], 'results': json.loads(r[6]) if r[6] else []
-                } for r in rows]
-                return {'success': True, 'data': logs}
-            else:
-                return {'success': False, 'error': f'Unknown collection: {collection}'}
+            rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+            return {'success': True, 'sql': sql, 'plan': [r[3] for r in rows]}
         finally:
-            conn.close()
+            self.release(conn)
 
 
 def hash_password(password):
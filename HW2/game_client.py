@@ -2,7 +2,7 @@ import pygame
 import socket
 import threading
 import sys
-from protocol import send_message, recv_message, ProtocolError
+from protocol import send_message, recv_message, ProtocolError, set_codec, set_compression
 from tetris_logic import SHAPES, SHAPE_COLORS
 
 
@@ -115,11 +115,15 @@ class GameClient:
                 'roomId': self.room_id,
                 'userId': self.user_id,
                 'username': self.username,
-                'spectate': self.spectate
+                'spectate': self.spectate,
+                'codecs': ['binary', 'json'],
+                'compress': True
             })
 
             welcome = recv_message(self.socket)
             if welcome.get('type') == 'WELCOME':
+                set_codec(self.socket, welcome.get('codec', 'json'))
+                set_compression(self.socket, bool(welcome.get('compress')))
                 self.role = welcome.get('role')
                 self.connected = True
                 if self.spectate:
@@ -3,7 +3,7 @@ import threading
 import time
 import sys
 from datetime import datetime
-from protocol import send_message, recv_message, ProtocolError
+from protocol import send_message, recv_message, ProtocolError, CODECS, encode_message, send_encoded, set_codec, set_compression
 from tetris_logic import TetrisGame
 import random
 
@@ -66,6 +66,8 @@ class GameServer:
             username = hello.get('username', str(user_id))
             room_id = hello.get('roomId')
             is_spectator = hello.get('spectate', False)
+            codec = next((c for c in hello.get('codecs', []) if c in CODECS), 'json')
+            compress = hello.get('compress') is True
             if room_id != self.room_id:
                 send_message(client_socket, {'type': 'ERROR', 'message': 'Invalid room'})
                 return
@@ -73,7 +75,8 @@ class GameServer:
                 with self.lock:
                     self.spectators[user_id] = {
                         'socket': client_socket,
-                        'name': username
+                        'name': username,
+                        'codec': codec
                     }
                     print(f"[Game] Spectator {username} joined")
                 send_message(client_socket, {
@@ -84,8 +87,12 @@ class GameServer:
                     'gravityPlan': {
                         'mode': 'fixed',
                         'dropMs': self.drop_interval
-                    }
+                    },
+                    'codec': codec,
+                    'compress': compress
                 })
+                set_codec(client_socket, codec)
+                set_compression(client_socket, compress)
                 while self.running:
                     time.sleep(1)
                 return
@@ -100,7 +107,8 @@ class GameServer:
                     'role': role,
                     'game': game,
                     'username': username,
-                    'ready': False
+                    'ready': False,
+                    'codec': codec
                 }
                 print(f"[Game] Player {username} (ID: {user_id}) joined as {role}")
             send_message(client_socket, {
@@ -111,8 +119,12 @@ class GameServer:
                 'gravityPlan': {
                     'mode': 'fixed',
                     'dropMs': self.drop_interval
-                }
+                },
+                'codec': codec,
+                'compress': compress
             })
+            set_codec(client_socket, codec)
+            set_compression(client_socket, compress)
             with self.lock:
                 self.players[user_id]['ready'] = True
                 if len(self.players) == 2 and all(p['ready'] for p in self.players.values()):
@@ -210,14 +222,15 @@ class GameServer:
             'gameOver': state['gameOver'],
             'timestamp': time.time()
         }
-        for pid, p in self.players.items():
-            try:
-                send_message(p['socket'], snapshot)
-            except:
-                pass
-        for sid, s in self.spectators.items():
+        self.broadcast(snapshot)
+    def broadcast(self, msg):
+        encoded = {}
+        for client in list(self.players.values()) + list(self.spectators.values()):
+            codec = client.get('codec', 'json')
+            if codec not in encoded:
+                encoded[codec] = encode_message(msg, codec)
             try:
-                send_message(s['socket'], snapshot)
+                send_encoded(client['socket'], encoded[codec])
             except:
                 pass
     def check_game_end(self):
@@ -250,17 +263,7 @@ class GameServer:
                 'winner': winner_id
             }
 
-            for player in self.players.values():
-                try:
-                    send_message(player['socket'], end_msg)
-                except:
-                    pass
-
-            for spectator in self.spectators.values():
-                try:
-                    send_message(spectator['socket'], end_msg)
-                except:
-                    pass
+            self.broadcast(end_msg)
 
             self.notify_lobby_game_end(results)
             print(f"[Game] Game ended. Winner: {winner_id}")
@@ -292,17 +295,7 @@ class GameServer:
             'reason': 'insufficient_players'
         }
 
-        for player in self.players.values():
-            try:
-                send_message(player['socket'], end_msg)
-            except:
-                pass
-
-        for spectator in self.spectators.values():
-            try:
-                send_message(spectator['socket'], end_msg)
-            except:
-                pass
+        self.broadcast(end_msg)
 
         self.notify_lobby_game_end(results)
         print(f"[Game] Game ended due to insufficient players. Winner: {winner_id}")
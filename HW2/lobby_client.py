@@ -2,10 +2,12 @@ import socket
 import threading
 import time
 import subprocess
+from concurrent.futures import Future
 from protocol import send_message, recv_message, ProtocolError
 
 LOBBY_HOST = 'localhost'
 LOBBY_PORT = 10002
+REQUEST_TIMEOUT = 30
 
 
 class LobbyClient:
@@ -19,28 +21,96 @@ class LobbyClient:
         self.username = None
         self.in_room = False
         self.current_room_id = None
-        self.room_check_thread = None
-        self.stop_checking = False
         self.game_launched = False
+
+        self.send_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.pending = {}
+        self.next_request_id = 0
     def connect(self):
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.host, self.port))
             self.connected = True
             print(f"[Connected to Lobby Server at {self.host}:{self.port}]")
+            threading.Thread(target=self.receive_loop, daemon=True).start()
             return True
         except Exception as e:
             print(f"Connection failed: {e}")
             return False
+    def receive_loop(self):
+        # responses go to their pending request, events to handle_event
+        try:
+            while self.connected:
+                msg = recv_message(self.socket)
+                request_id = msg.pop('requestId', None)
+                if request_id is not None:
+                    with self.pending_lock:
+                        future = self.pending.pop(request_id, None)
+                    if future is not None:
+                        future.set_result(msg)
+                elif msg.get('type') == 'EVENT':
+                    try:
+                        self.handle_event(msg.get('event'), msg.get('data', {}))
+                    except Exception as e:
+                        print(f"Event handling failed: {e}")
+        except (ConnectionError, ProtocolError, OSError) as e:
+            if self.connected:
+                print(f"\n[Disconnected from Lobby Server: {e}]")
+        finally:
+            self.connected = False
+            with self.pending_lock:
+                pending, self.pending = self.pending, {}
+            for future in pending.values():
+                future.set_result({'success': False, 'error': 'Connection lost'})
+    def submit_request(self, action, data=None):
+        # does not wait; the returned Future yields the response
+        future = Future()
+        with self.pending_lock:
+            self.next_request_id += 1
+            request_id = self.next_request_id
+            self.pending[request_id] = future
+        try:
+            with self.send_lock:
+                send_message(self.socket, {'action': action, 'data': data or {}, 'requestId': request_id})
+        except Exception as e:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            future.set_result({'success': False, 'error': str(e)})
+        return future
     def send_request(self, action, data=None):
         try:
-            request = {'action': action, 'data': data or {}}
-            send_message(self.socket, request)
-            response = recv_message(self.socket)
-            return response
+            return self.submit_request(action, data).result(REQUEST_TIMEOUT)
         except Exception as e:
             print(f"Request failed: {e}")
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'error': str(e) or 'Request timed out'}
+    def handle_event(self, event, data):
+        if event == 'invitation':
+            print(f"\n\n📨 {data.get('from_user_name')} invited you to room '{data.get('room_name')}' (ID: {data.get('room_id')})")
+        elif event == 'game_started':
+            if self.game_launched or data.get('roomId') != self.current_room_id:
+                return
+            print("\n\n🎮 Game is starting! Launching game client...")
+            self.game_launched = True
+            self.launch_game_client(data.get('gamePort'))
+        elif event == 'game_ended':
+            if data.get('roomId') == self.current_room_id:
+                print("\n\n🎮 Game ended. You can start a new game.")
+                self.game_launched = False
+    def launch_game_client(self, game_port):
+        try:
+            subprocess.Popen([
+                'python3', 'game_client.py',
+                self.host,
+                str(game_port),
+                str(self.user_id),
+                str(self.current_room_id),
+                self.username
+            ])
+            print("✓ Game client launched!")
+        except Exception as e:
+            print(f"✗ Failed to launch: {e}")
+            print(f"Manual: python3 game_client.py {self.host} {game_port} {self.user_id} {self.current_room_id} {self.username}")
     def register(self):
         print("\n=== Register ===")
         name = input("Username: ").strip()
@@ -90,17 +160,24 @@ class LobbyClient:
         else:
             print(f"✗ Failed to list users: {response.get('error')}")
     def list_rooms(self):
-        response = self.send_request('list_rooms')
-        if response.get('success'):
+        after = None
+        print("\n=== Rooms ===")
+        while True:
+            response = self.send_request('list_rooms', {'after': after})
+            if not response.get('success'):
+                print(f"✗ Failed to list rooms: {response.get('error')}")
+                return
             rooms = response.get('rooms', [])
-            print(f"\n=== Rooms ({len(rooms)}) ===")
             for room in rooms:
                 visibility = room.get('visibility', 'public')
                 status = room.get('status', 'idle')
                 member_count = room.get('memberCount', 0)
                 print(f"  [{room['id']}] {room['name']} | {visibility} | {status} | {member_count}/2 players")
-        else:
-            print(f"✗ Failed to list rooms: {response.get('error')}")
+            after = response.get('next')
+            if after is None:
+                return
+            if input("More rooms? (y/N) ").strip().lower() != 'y':
+                return
     def create_room(self):
         print("\n=== Create Room ===")
         name = input("Room name: ").strip()
@@ -113,8 +190,6 @@ class LobbyClient:
             self.in_room = True
             self.current_room_id = response.get('roomId')
             print(f"✓ Room created! Room ID: {self.current_room_id}")
-
-            self.start_room_check()
         else:
             print(f"✗ Failed to create room: {response.get('error')}")
     def join_room(self):
@@ -130,8 +205,6 @@ class LobbyClient:
             self.in_room = True
             self.current_room_id = room_id
             print(f"✓ Joined room {room_id}")
-
-            self.start_room_check()
         else:
             print(f"✗ Failed to join room: {response.get('error')}")
     def leave_room(self):
@@ -139,59 +212,10 @@ class LobbyClient:
         if response.get('success'):
             self.in_room = False
             self.current_room_id = None
-            self.stop_checking = True
             self.game_launched = False
             print("✓ Left room")
         else:
             print(f"✗ Failed to leave room: {response.get('error')}")
-    def start_room_check(self):
-        if self.room_check_thread and self.room_check_thread.is_alive():
-            return
-        self.stop_checking = False
-        self.room_check_thread = threading.Thread(target=self.check_room_status, daemon=True)
-        self.room_check_thread.start()
-    def check_room_status(self):
-        last_status = None
-        while not self.stop_checking and self.in_room:
-            try:
-
-                response = self.send_request('list_rooms')
-                if response.get('success'):
-                    rooms = response.get('rooms', [])
-                    current_room = next((r for r in rooms if r['id'] == self.current_room_id), None)
-                    if current_room:
-                        status = current_room.get('status')
-
-                        if status in ['idle', 'waiting'] and last_status == 'playing':
-                            print("\n\n🎮 Game ended. You can start a new game.")
-                            self.game_launched = False
-
-                        if status == 'playing' and last_status != 'playing' and not self.game_launched:
-                            print("\n\n🎮 Game is starting! Launching game client...")
-
-                            self.game_launched = True
-
-                            game_info = self.send_request('get_game_info', {'roomId': self.current_room_id})
-                            if game_info.get('success'):
-                                game_port = game_info.get('gamePort')
-                                try:
-                                    subprocess.Popen([
-                                        'python3', 'game_client.py',
-                                        self.host,
-                                        str(game_port),
-                                        str(self.user_id),
-                                        str(self.current_room_id),
-                                        self.username
-                                    ])
-                                    print("✓ Game client launched!")
-                                except Exception as e:
-                                    print(f"✗ Failed to launch: {e}")
-                                    print(f"Manual: python3 game_client.py {self.host} {game_port} {self.user_id} {self.current_room_id} {self.username}")
-                        last_status = status
-                time.sleep(2)
-            except Exception as e:
-
-                time.sleep(2)
     def invite_user(self):
         self.list_online_users()
         print("\n=== Invite User ===")
@@ -234,8 +258,6 @@ class LobbyClient:
                     self.in_room = True
                     self.current_room_id = invite['room_id']
                     print(f"✓ Joined room '{invite['room_name']}'")
-
-                    self.start_room_check()
                 else:
                     print(f"✗ Failed to accept invitation: {response.get('error')}")
             else:
@@ -363,7 +385,13 @@ class LobbyClient:
                     elif choice == '7':
                         self.logout()
 
+        self.connected = False
         if self.socket:
+            try:
+                # wake the receive thread, close() alone leaves it blocked
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.socket.close()
         print("\nGoodbye!")
     def run(self):
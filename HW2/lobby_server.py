@@ -1,6 +1,8 @@
 import socket
 import threading
 import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from protocol import send_message, recv_message, ProtocolError
 import hashlib
@@ -16,6 +18,76 @@ DB_PORT = 10001
 GAME_SERVER_PORT_START = 10100
 GAME_SERVER_PORT_END = 10200
 
+# actions that change the connection's login state stay in arrival order
+SESSION_ACTIONS = ('login', 'logout')
+
+ROOM_PAGE_SIZE = 20
+ROOM_LIST_FIELDS = ['name', 'hostUserId', 'visibility', 'status']
+
+# Room records are only written by this lobby, so cached copies stay valid;
+# the TTL bounds how stale they get if something else edits the database
+ROOM_CACHE_SIZE = 1024
+ROOM_CACHE_TTL = 30.0
+
+
+class RoomCache:
+    # read-through Room cache keyed by id (LRU + TTL); the lobby writes to the
+    # DB first and then applies the change here with put/update/invalidate
+    def __init__(self, load, max_size=ROOM_CACHE_SIZE, ttl=ROOM_CACHE_TTL):
+        self.load = load
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # room_id -> (expires_at, room)
+        self.lock = threading.Lock()
+        # bumped by every write, so a load that raced with one is not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, room_id):
+        # None if the room does not exist
+        with self.lock:
+            entry = self.entries.get(room_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(room_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.generation
+        room = self.load(room_id)
+        if room is not None:
+            with self.lock:
+                if generation == self.generation:
+                    self._store(room_id, room)
+        return room
+
+    def put(self, room):
+        with self.lock:
+            self.generation += 1
+            self._store(room['id'], room)
+
+    def update(self, room_id, updates):
+        with self.lock:
+            self.generation += 1
+            entry = self.entries.get(room_id)
+            if entry is not None:
+                self.entries[room_id] = (entry[0], {**entry[1], **updates})
+
+    def invalidate(self, room_id):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(room_id, None)
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+    def _store(self, room_id, room):
+        self.entries[room_id] = (time.monotonic() + self.ttl, room)
+        self.entries.move_to_end(room_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
 
 class LobbyServer:
     def __init__(self, host=LOBBY_HOST, port=LOBBY_PORT):
@@ -35,6 +107,13 @@ class LobbyServer:
 
         self.next_game_port = GAME_SERVER_PORT_START
 
+        # socket -> {'lock': send lock, 'push': client sent a requestId}
+        self.connections = {}
+
+        self.workers = ThreadPoolExecutor(max_workers=32)
+
+        self.rooms = RoomCache(self.load_room)
+
         self.lock = threading.Lock()
     def start(self):
         self.running = True
@@ -63,15 +142,26 @@ class LobbyServer:
         finally:
             server_socket.close()
             self.cleanup_game_servers()
+            print(f"[Lobby Server] Room cache: {self.rooms.stats()}")
     def handle_client(self, client_socket, addr):
         user_id = None
+        conn = {'lock': threading.Lock(), 'push': False}
+        with self.lock:
+            self.connections[client_socket] = conn
         try:
             while True:
 
                 request = recv_message(client_socket)
                 action = request.get('action')
+                request_id = request.get('requestId')
                 print(f"[Lobby] Request from {addr}: {action}")
 
+                if request_id is not None and action not in SESSION_ACTIONS:
+                    # multiplexed: answer whenever it is done, tagged with its id
+                    conn['push'] = True
+                    self.workers.submit(self.respond, client_socket, request, user_id)
+                    continue
+
                 response = self.process_request(request, client_socket, user_id)
 
                 if action == 'login' and response.get('success'):
@@ -79,7 +169,10 @@ class LobbyServer:
                 elif action == 'logout':
                     user_id = None
 
-                send_message(client_socket, response)
+                if request_id is not None:
+                    conn['push'] = True
+                    response['requestId'] = request_id
+                self.send_to(client_socket, response)
         except (ConnectionError, ProtocolError) as e:
             print(f"[Lobby] Connection error from {addr}: {e}")
         except Exception as e:
@@ -90,8 +183,36 @@ class LobbyServer:
 
             if user_id:
                 self.handle_user_disconnect(user_id)
+            with self.lock:
+                self.connections.pop(client_socket, None)
             client_socket.close()
             print(f"[Lobby] Connection closed: {addr}")
+    def respond(self, client_socket, request, user_id):
+        response = self.process_request(request, client_socket, user_id)
+        response['requestId'] = request['requestId']
+        try:
+            self.send_to(client_socket, response)
+        except OSError as e:
+            print(f"[Lobby] Failed to answer request {request['requestId']}: {e}")
+    def send_to(self, client_socket, message):
+        conn = self.connections.get(client_socket)
+        if conn is None:
+            send_message(client_socket, message)
+            return
+        with conn['lock']:
+            send_message(client_socket, message)
+    def push_event(self, user_ids, event, data):
+        # unsolicited event, only to clients that multiplex with requestId
+        with self.lock:
+            targets = [self.online_users[uid]['socket'] for uid in user_ids
+                       if uid in self.online_users]
+            targets = [sock for sock in targets
+                       if self.connections.get(sock, {}).get('push')]
+        for sock in targets:
+            try:
+                self.send_to(sock, {'type': 'EVENT', 'event': event, 'data': data})
+            except OSError as e:
+                print(f"[Lobby] Failed to push {event}: {e}")
     def process_request(self, request, client_socket, user_id):
         action = request.get('action')
         data = request.get('data', {})
@@ -105,7 +226,7 @@ class LobbyServer:
             elif action == 'list_online':
                 return self.list_online_users()
             elif action == 'list_rooms':
-                return self.list_rooms()
+                return self.list_rooms(data)
             elif action == 'create_room':
                 return self.create_room(user_id, data)
             elif action == 'join_room':
@@ -119,7 +240,15 @@ class LobbyServer:
             elif action == 'accept_invitation':
                 return self.accept_invitation(user_id, data)
             elif action == 'start_game':
-                return self.start_game(user_id)
+                response = self.start_game(user_id)
+                if response.get('success'):
+                    others = [uid for uid in response['players'] if uid != user_id]
+                    self.push_event(others, 'game_started', {
+                        'roomId': self.online_users.get(user_id, {}).get('room_id'),
+                        'gamePort': response['gamePort'],
+                        'playerNames': response['playerNames']
+                    })
+                return response
             elif action == 'get_game_info':
                 return self.get_game_info(user_id, data)
             elif action == 'spectate_room':
@@ -219,11 +348,19 @@ class LobbyServer:
                 for uid, info in self.online_users.items()
             ]
         return {'success': True, 'users': users}
-    def list_rooms(self):
+    def list_rooms(self, data):
+        query = {
+            'limit': min(int(data.get('limit') or ROOM_PAGE_SIZE), ROOM_PAGE_SIZE),
+            'after': data.get('after'),
+            'fields': ROOM_LIST_FIELDS
+        }
+        for field in ('status', 'visibility'):
+            if field in data:
+                query[field] = data[field]
         response = self.db_request({
             'collection': 'Room',
             'action': 'query',
-            'data': {}
+            'data': query
         })
         if not response.get('success'):
             return response
@@ -232,7 +369,7 @@ class LobbyServer:
         with self.lock:
             for room in rooms:
                 room['memberCount'] = len(self.room_members.get(room['id'], []))
-        return {'success': True, 'rooms': rooms}
+        return {'success': True, 'rooms': rooms, 'next': response.get('next')}
     def create_room(self, user_id, data):
         if not user_id:
             return {'success': False, 'error': 'Not logged in'}
@@ -258,6 +395,9 @@ class LobbyServer:
         if not response.get('success'):
             return response
         room_id = response['id']
+        # createdAt is set by the DB server and is not known here
+        self.rooms.put({'id': room_id, 'name': name, 'hostUserId': user_id,
+                        'visibility': visibility, 'inviteList': [], 'status': 'idle'})
 
         with self.lock:
             self.online_users[user_id]['room_id'] = room_id
@@ -270,14 +410,8 @@ class LobbyServer:
         if not room_id:
             return {'success': False, 'error': 'Room ID required'}
 
-        room_response = self.db_request({
-            'collection': 'Room',
-            'action': 'read',
-            'data': {'id': room_id}
-        })
-        if not room_response.get('success'):
+        if self.rooms.get(room_id) is None:
             return {'success': False, 'error': 'Room not found'}
-        room = room_response['data']
 
         with self.lock:
             members = self.room_members.get(room_id, [])
@@ -311,6 +445,7 @@ class LobbyServer:
                         'action': 'delete',
                         'data': {'id': room_id}
                     })
+                    self.rooms.invalidate(room_id)
             self.online_users[user_id]['room_id'] = None
         return {'success': True}
     def invite_user(self, user_id, data):
@@ -319,30 +454,31 @@ class LobbyServer:
         target_user_id = data.get('targetUserId')
         with self.lock:
             room_id = self.online_users[user_id]['room_id']
-            if not room_id:
+        if not room_id:
+            return {'success': False, 'error': 'Not in a room'}
+        # a cache miss goes to the DB, so look the room up before taking the lock
+        room = self.rooms.get(room_id)
+        if room is None:
+            return {'success': False, 'error': 'Room not found'}
+
+        with self.lock:
+            if self.online_users[user_id]['room_id'] != room_id:
                 return {'success': False, 'error': 'Not in a room'}
             if target_user_id not in self.online_users:
                 return {'success': False, 'error': 'Target user not online'}
             if self.online_users[target_user_id]['room_id']:
                 return {'success': False, 'error': 'Target user already in a room'}
 
-            room_response = self.db_request({
-                'collection': 'Room',
-                'action': 'read',
-                'data': {'id': room_id}
-            })
-            if not room_response.get('success'):
-                return {'success': False, 'error': 'Room not found'}
-            room = room_response['data']
-
             if target_user_id not in self.invitations:
                 self.invitations[target_user_id] = []
-            self.invitations[target_user_id].append({
+            invitation = {
                 'from_user_id': user_id,
                 'from_user_name': self.online_users[user_id]['name'],
                 'room_id': room_id,
                 'room_name': room['name']
-            })
+            }
+            self.invitations[target_user_id].append(invitation)
+        self.push_event([target_user_id], 'invitation', invitation)
         return {'success': True}
     def list_invitations(self, user_id):
         if not user_id:
@@ -409,23 +545,42 @@ class LobbyServer:
             return {'success': False, 'error': 'Not logged in'}
         with self.lock:
             room_id = self.online_users[user_id]['room_id']
-            if not room_id:
+        if not room_id:
+            return {'success': False, 'error': 'Not in a room'}
+        # a cache miss goes to the DB, so look the room up before taking the lock
+        room = self.rooms.get(room_id)
+        if room is None:
+            return {'success': False, 'error': 'Room not found'}
+        if room['hostUserId'] != user_id:
+            return {'success': False, 'error': 'Only host can start game'}
+
+        with self.lock:
+            if self.online_users[user_id]['room_id'] != room_id:
                 return {'success': False, 'error': 'Not in a room'}
             members = self.room_members.get(room_id, [])
             if len(members) != 2:
                 return {'success': False, 'error': 'Need exactly 2 players'}
 
-            room_response = self.db_request({
-                'collection': 'Room',
-                'action': 'read',
-                'data': {'id': room_id}
+            # the update re-checks the host, so a stale cache entry cannot start a game
+            response = self.db_request({
+                'action': 'batch',
+                'data': {'ops': [{
+                    'collection': 'Room',
+                    'action': 'update',
+                    'data': {
+                        'id': room_id,
+                        'updates': {'status': 'playing'},
+                        'where': {'hostUserId': user_id}
+                    },
+                    'expect': 1
+                }]}
             })
-            if not room_response.get('success'):
-                return {'success': False, 'error': 'Room not found'}
-            room = room_response['data']
-
-            if room['hostUserId'] != user_id:
-                return {'success': False, 'error': 'Only host can start game'}
+            if not response.get('success'):
+                self.rooms.invalidate(room_id)
+                if response.get('results', [{}])[0].get('matched') == 0:
+                    return {'success': False, 'error': 'Only host can start game'}
+                return response
+            self.rooms.update(room_id, {'status': 'playing'})
 
             game_port = self.next_game_port
             self.next_game_port += 1
@@ -443,15 +598,6 @@ class LobbyServer:
                     'process': process
                 }
 
-                self.db_request({
-                    'collection': 'Room',
-                    'action': 'update',
-                    'data': {
-                        'id': room_id,
-                        'updates': {'status': 'playing'}
-                    }
-                })
-
                 player_names = [self.online_users[uid]['name'] for uid in members]
                 return {
                     'success': True,
@@ -460,6 +606,12 @@ class LobbyServer:
                     'playerNames': player_names
                 }
             except Exception as e:
+                self.db_request({
+                    'collection': 'Room',
+                    'action': 'update',
+                    'data': {'id': room_id, 'updates': {'status': 'idle'}}
+                })
+                self.rooms.invalidate(room_id)
                 return {'success': False, 'error': f'Failed to start game server: {e}'}
     def handle_game_ended(self, data):
         room_id = data.get('roomId')
@@ -467,29 +619,36 @@ class LobbyServer:
         if not room_id:
             return {'success': False, 'error': 'Room ID required'}
 
-        self.db_request({
-            'collection': 'Room',
-            'action': 'update',
-            'data': {
-                'id': room_id,
-                'updates': {'status': 'idle'}
-            }
-        })
-
         with self.lock:
             members = self.room_members.get(room_id, [])
-        self.db_request({
-            'collection': 'GameLog',
-            'action': 'create',
-            'data': {
-                'matchId': f"{room_id}_{int(time.time())}",
-                'roomId': room_id,
-                'users': members,
-                'startAt': data.get('startAt', datetime.now().isoformat()),
-                'endAt': datetime.now().isoformat(),
-                'results': results
-            }
+        # room reset and game log commit together in one round trip
+        response = self.db_request({
+            'action': 'batch',
+            'data': {'ops': [{
+                'collection': 'Room',
+                'action': 'update',
+                'data': {
+                    'id': room_id,
+                    'updates': {'status': 'idle'}
+                }
+            }, {
+                'collection': 'GameLog',
+                'action': 'create',
+                'data': {
+                    'matchId': f"{room_id}_{int(time.time())}",
+                    'roomId': room_id,
+                    'users': members,
+                    'startAt': data.get('startAt', datetime.now().isoformat()),
+                    'endAt': datetime.now().isoformat(),
+                    'results': results
+                }
+            }]}
         })
+        if response.get('success'):
+            self.rooms.update(room_id, {'status': 'idle'})
+        else:
+            self.rooms.invalidate(room_id)
+            print(f"[Lobby] Failed to record game end for room {room_id}: {response.get('error')}")
 
         with self.lock:
             if room_id in self.game_servers:
@@ -498,6 +657,7 @@ class LobbyServer:
                 except:
                     pass
                 del self.game_servers[room_id]
+        self.push_event(members, 'game_ended', {'roomId': room_id, 'results': results})
         return {'success': True}
     def cleanup_game_servers(self):
         with self.lock:
@@ -506,6 +666,13 @@ class LobbyServer:
                     game_info['process'].terminate()
                 except:
                     pass
+    def load_room(self, room_id):
+        response = self.db_request({
+            'collection': 'Room',
+            'action': 'read',
+            'data': {'id': room_id}
+        })
+        return response['data'] if response.get('success') else None
     def db_request(self, request):
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -1,53 +1,381 @@
+import asyncio
 import struct
 import socket
 import json
+import weakref
+import zlib
 
+# largest single frame; bigger messages go out as continuation frames
 MAX_MESSAGE_LENGTH = 65536
+# largest message after reassembly and decompression
+MAX_ASSEMBLED_LENGTH = 16 * 1024 * 1024
+COMPRESS_THRESHOLD = 16 * 1024
+COMPRESS_LEVEL = 1
+
+_HEADER = struct.Struct('!I')
+# high bits of the length word
+FLAG_COMPRESSED = 0x80000000  # body is part of a zlib stream
+FLAG_MORE = 0x40000000        # another frame of the same message follows
+_LENGTH_MASK = 0x3FFFFFFF
+
+# below this size one small copy is cheaper than building an iovec
+_GATHER_THRESHOLD = 16 * 1024
+
+# one receive buffer per connection, reused for every frame
+_recv_buffers = weakref.WeakKeyDictionary()
 
 class ProtocolError(Exception):
     pass
 
 
+class JsonCodec:
+    name = 'json'
+
+    def encode(self, data: dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+# struct encoding for INPUT, SNAPSHOT and GAME_END; bodies start with a tag
+# byte instead of '{', anything else falls back to JSON
+class BinaryCodec:
+    name = 'binary'
+
+    TAG_INPUT = 1
+    TAG_SNAPSHOT = 2
+    TAG_GAME_END = 3
+
+    ACTIONS = ['LEFT', 'RIGHT', 'CW', 'CCW', 'SOFT_DROP', 'HARD_DROP', 'HOLD']
+    SHAPES = ['I', 'O', 'T', 'S', 'Z', 'J', 'L']
+    ROLES = ['P1', 'P2']
+    NONE = 0xFF
+
+    INPUT = struct.Struct('!BiB')
+    # tag, userId, role, flags, score, lines, level, shape, x, y, rotation,
+    # hold, timestamp, len(next), len(username), board height, board width
+    SNAPSHOT = struct.Struct('!BiBBIIHBbbBBdBBBB')
+    GAME_END = struct.Struct('!BBiB')
+    RESULT = struct.Struct('!iIIIB')
+
+    SNAPSHOT_KEYS = {'type', 'userId', 'username', 'role', 'boardRLE', 'active', 'hold',
+                     'next', 'score', 'lines', 'level', 'gameOver', 'timestamp'}
+    ACTIVE_KEYS = {'shape', 'x', 'y', 'rotation'}
+    RESULT_KEYS = {'userId', 'score', 'lines', 'maxCombo', 'gameOver'}
+
+    def __init__(self):
+        self.json = JsonCodec()
+        self.action_ids = {a: i for i, a in enumerate(self.ACTIONS)}
+        self.shape_ids = {s: i for i, s in enumerate(self.SHAPES)}
+        self.role_ids = {r: i for i, r in enumerate(self.ROLES)}
+
+    def encode(self, data: dict) -> bytes:
+        kind = data.get('type')
+        try:
+            if kind == 'INPUT' and data.keys() == {'type', 'userId', 'action'}:
+                return self.INPUT.pack(self.TAG_INPUT, data['userId'],
+                                       self.action_ids[data['action']])
+            if kind == 'SNAPSHOT' and data.keys() == self.SNAPSHOT_KEYS:
+                return self._encode_snapshot(data)
+            if kind == 'GAME_END':
+                return self._encode_game_end(data)
+        except (KeyError, TypeError, ValueError, struct.error):
+            pass
+        return self.json.encode(data)
+
+    def _shape(self, shape):
+        return self.NONE if shape is None else self.shape_ids[shape]
+
+    def _encode_snapshot(self, data):
+        active = data['active']
+        if active.keys() != self.ACTIVE_KEYS or type(data['gameOver']) is not bool:
+            raise ValueError('unsupported snapshot')
+        rows = data['boardRLE'].split('|')
+        width = len(rows[0])
+        if any(len(row) != width for row in rows):
+            raise ValueError('ragged board')
+        flat = ''.join(rows)
+        if not (flat.isascii() and flat.isdigit()):
+            raise ValueError('board cells must be single digits')
+        # digits are valid hex, so fromhex packs two cells per byte in C
+        board = bytes.fromhex(flat if len(flat) % 2 == 0 else flat + '0')
+        name = data['username'].encode('utf-8')
+        nxt = bytes(self.shape_ids[s] for s in data['next'])
+        head = self.SNAPSHOT.pack(
+            self.TAG_SNAPSHOT, data['userId'], self.role_ids[data['role']],
+            int(data['gameOver']), data['score'], data['lines'], data['level'],
+            self._shape(active['shape']), active['x'], active['y'], active['rotation'],
+            self._shape(data['hold']), data['timestamp'], len(nxt), len(name),
+            len(rows), width)
+        return b''.join((head, nxt, name, board))
+
+    def _encode_game_end(self, data):
+        keys = data.keys() - {'type', 'results', 'winner', 'reason'}
+        if keys or any(r.keys() != self.RESULT_KEYS or type(r['gameOver']) is not bool
+                       for r in data['results']):
+            raise ValueError('unsupported game end')
+        winner = data.get('winner')
+        reason = data.get('reason')
+        flags = (winner is not None) | (('reason' in data) << 1)
+        parts = [self.GAME_END.pack(self.TAG_GAME_END, flags,
+                                    0 if winner is None else winner, len(data['results']))]
+        for r in data['results']:
+            parts.append(self.RESULT.pack(r['userId'], r['score'], r['lines'],
+                                          r['maxCombo'], r['gameOver']))
+        if 'reason' in data:
+            parts.append(reason.encode('utf-8'))
+        return b''.join(parts)
+
+    def decode(self, body) -> dict:
+        tag = body[0]
+        if tag == self.TAG_INPUT:
+            _, user_id, action = self.INPUT.unpack_from(body)
+            return {'type': 'INPUT', 'userId': user_id, 'action': self.ACTIONS[action]}
+        if tag == self.TAG_SNAPSHOT:
+            return self._decode_snapshot(body)
+        if tag == self.TAG_GAME_END:
+            return self._decode_game_end(body)
+        raise ProtocolError(f"Unknown binary message tag: {tag}")
+
+    def _unshape(self, value):
+        return None if value == self.NONE else self.SHAPES[value]
+
+    def _decode_snapshot(self, body):
+        (_, user_id, role, flags, score, lines, level, shape, x, y, rotation,
+         hold, timestamp, n_next, n_name, height, width) = self.SNAPSHOT.unpack_from(body)
+        pos = self.SNAPSHOT.size
+        nxt = [self.SHAPES[i] for i in body[pos:pos + n_next]]
+        pos += n_next
+        name = str(body[pos:pos + n_name], 'utf-8')
+        pos += n_name
+        cells = body[pos:pos + (height * width + 1) // 2]
+        if width % 2 == 0:
+            # one separator every width/2 bytes gives the row layout directly
+            board = cells.hex('|', -(width // 2))
+        else:
+            flat = cells.hex()
+            board = '|'.join(flat[r * width:(r + 1) * width] for r in range(height))
+        if not board.replace('|', '').isdigit():
+            raise ProtocolError("Invalid board cells")
+        return {
+            'type': 'SNAPSHOT',
+            'userId': user_id,
+            'username': name,
+            'role': self.ROLES[role],
+            'boardRLE': board,
+            'active': {'shape': self._unshape(shape), 'x': x, 'y': y, 'rotation': rotation},
+            'hold': self._unshape(hold),
+            'next': nxt,
+            'score': score,
+            'lines': lines,
+            'level': level,
+            'gameOver': bool(flags & 1),
+            'timestamp': timestamp
+        }
+
+    def _decode_game_end(self, body):
+        _, flags, winner, count = self.GAME_END.unpack_from(body)
+        pos = self.GAME_END.size
+        results = []
+        for _ in range(count):
+            user_id, score, lines, max_combo, over = self.RESULT.unpack_from(body, pos)
+            pos += self.RESULT.size
+            results.append({'userId': user_id, 'score': score, 'lines': lines,
+                            'maxCombo': max_combo, 'gameOver': bool(over)})
+        msg = {'type': 'GAME_END', 'results': results,
+               'winner': winner if flags & 1 else None}
+        if flags & 2:
+            msg['reason'] = str(body[pos:], 'utf-8')
+        return msg
+
+
+CODECS = {'json': JsonCodec(), 'binary': BinaryCodec()}
+
+# codec negotiated for each connection; anything not listed speaks JSON
+_send_codecs = weakref.WeakKeyDictionary()
+
+
+def set_codec(sock: socket.socket, name: str) -> None:
+    if name not in CODECS:
+        raise ProtocolError(f"Unknown codec: {name}")
+    _send_codecs[sock] = CODECS[name]
+
+
+def get_codec(sock: socket.socket):
+    return _send_codecs.get(sock, CODECS['json'])
+
+
+# connections whose peer said it accepts compressed frames (HELLO/WELCOME);
+# others only get compressed bodies that would not fit in one frame anyway
+_compress_peers = weakref.WeakSet()
+
+
+def set_compression(sock: socket.socket, enabled: bool = True) -> None:
+    if enabled:
+        _compress_peers.add(sock)
+    else:
+        _compress_peers.discard(sock)
+
+
+def encode_message(data: dict, codec: str = 'json') -> bytes:
+    # encode once, then send_encoded() to many sockets
+    return CODECS[codec].encode(data)
+
+
 def send_message(sock: socket.socket, data: dict) -> None:
-    message = json.dumps(data, ensure_ascii=False).encode('utf-8')
-    length = len(message)
-    if length > MAX_MESSAGE_LENGTH:
-        raise ProtocolError(f"Message too large: {length} bytes (max {MAX_MESSAGE_LENGTH})")
-    header = struct.pack('!I', length)
-    _send_all(sock, header + message)
+    send_encoded(sock, get_codec(sock).encode(data))
+
+
+def send_encoded(sock: socket.socket, message: bytes) -> None:
+    for header, chunk in _frames(message, sock in _compress_peers):
+        if len(chunk) < _GATHER_THRESHOLD:
+            sock.sendall(header + chunk)
+        else:
+            _send_all(sock, (header, chunk))
 
 
 def recv_message(sock: socket.socket) -> dict:
-    header = _recv_all(sock, 4)
-    if not header:
-        raise ConnectionError("Connection closed")
-    length = struct.unpack('!I', header)[0]
+    buf = _recv_buffers.get(sock)
+    if buf is None:
+        buf = memoryview(bytearray(_HEADER.size + MAX_MESSAGE_LENGTH))
+        _recv_buffers[sock] = buf
+    body = _recv_frame(sock, buf)
+    flags = _HEADER.unpack_from(buf)[0] & ~_LENGTH_MASK
+    if flags == 0:
+        return _decode(body)
+
+    # compressed and/or continued: inflate and reassemble frame by frame
+    message = _Reassembler(flags)
+    while not message.add(body):
+        body = _recv_frame(sock, buf)
+        message.next_frame(_HEADER.unpack_from(buf)[0] & ~_LENGTH_MASK)
+    return _decode(memoryview(message.data))
+
+
+# asyncio versions of send_message/recv_message for the DB server
+async def write_message(writer: asyncio.StreamWriter, data: dict, codec: str = 'json',
+                        compress: bool = False) -> None:
+    for header, chunk in _frames(CODECS[codec].encode(data), compress):
+        writer.write(header)
+        writer.write(chunk)
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict:
+    flags, body = await _read_frame(reader)
+    if flags == 0:
+        return _decode(memoryview(body))
+    message = _Reassembler(flags)
+    while not message.add(body):
+        flags, body = await _read_frame(reader)
+        message.next_frame(flags)
+    return _decode(memoryview(message.data))
+
+
+def _frames(message: bytes, compress: bool = False):
+    # returns the (header, chunk) frames of one message
+    if len(message) > MAX_ASSEMBLED_LENGTH:
+        raise ProtocolError(f"Message too large: {len(message)} bytes (max {MAX_ASSEMBLED_LENGTH})")
+    flags = 0
+    # a peer that never negotiated compression could still read a single
+    # uncompressed frame, so only oversized messages are compressed for it
+    limit = COMPRESS_THRESHOLD if compress else MAX_MESSAGE_LENGTH + 1
+    if len(message) >= limit:
+        packed = zlib.compress(message, COMPRESS_LEVEL)
+        if len(packed) < len(message):
+            message = packed
+            flags = FLAG_COMPRESSED
+    length = len(message)
+    if length <= MAX_MESSAGE_LENGTH:
+        return [(_HEADER.pack(flags | length), message)]
+    view = memoryview(message)
+    frames = []
+    for start in range(0, length, MAX_MESSAGE_LENGTH):
+        chunk = view[start:start + MAX_MESSAGE_LENGTH]
+        more = FLAG_MORE if start + MAX_MESSAGE_LENGTH < length else 0
+        frames.append((_HEADER.pack(flags | more | len(chunk)), chunk))
+    return frames
+
+
+# inflates and joins the frames of one compressed and/or continued message
+class _Reassembler:
+    def __init__(self, flags: int):
+        self.flags = flags
+        self.inflater = zlib.decompressobj() if flags & FLAG_COMPRESSED else None
+        self.data = bytearray()
+
+    def add(self, body) -> bool:
+        # True once the last frame has been added
+        try:
+            if self.inflater is None:
+                self.data += body
+            else:
+                self.data += self.inflater.decompress(body, MAX_ASSEMBLED_LENGTH + 1 - len(self.data))
+                if self.inflater.unconsumed_tail:
+                    raise ProtocolError("Decompressed message too large")
+        except zlib.error as e:
+            raise ProtocolError(f"Failed to decompress message: {e}")
+        if len(self.data) > MAX_ASSEMBLED_LENGTH:
+            raise ProtocolError(f"Message too large: over {MAX_ASSEMBLED_LENGTH} bytes")
+        return not self.flags & FLAG_MORE
+
+    def next_frame(self, flags: int) -> None:
+        if flags & FLAG_COMPRESSED != self.flags & FLAG_COMPRESSED:
+            raise ProtocolError("Continuation frame changed compression")
+        self.flags = flags
+
+
+def _recv_frame(sock: socket.socket, buf: memoryview) -> memoryview:
+    _recv_all(sock, buf[:_HEADER.size])
+    length = _HEADER.unpack_from(buf)[0] & _LENGTH_MASK
     if length <= 0 or length > MAX_MESSAGE_LENGTH:
         raise ProtocolError(f"Invalid message length: {length}")
-    message = _recv_all(sock, length)
-    if not message:
-        raise ConnectionError("Connection closed while reading message body")
+    body = buf[_HEADER.size:_HEADER.size + length]
+    _recv_all(sock, body)
+    return body
+
+
+async def _read_frame(reader: asyncio.StreamReader):
+    try:
+        word = _HEADER.unpack(await reader.readexactly(_HEADER.size))[0]
+        length = word & _LENGTH_MASK
+        if length <= 0 or length > MAX_MESSAGE_LENGTH:
+            raise ProtocolError(f"Invalid message length: {length}")
+        return word & ~_LENGTH_MASK, await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Socket connection broken")
+
+
+def _decode(body) -> dict:
     try:
-        data = json.loads(message.decode('utf-8'))
+        if body[0] != 0x7B:
+            return CODECS['binary'].decode(body)
+        data = json.loads(str(body, 'utf-8'))
         return data
-    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+    except (json.JSONDecodeError, UnicodeDecodeError, struct.error, IndexError) as e:
         raise ProtocolError(f"Failed to decode message: {e}")
 
 
-def _send_all(sock: socket.socket, data: bytes) -> None:
-    total_sent = 0
-    while total_sent < len(data):
-        sent = sock.send(data[total_sent:])
+def _send_all(sock: socket.socket, buffers) -> None:
+    views = [memoryview(b) for b in buffers if len(b)]
+    if not hasattr(sock, 'sendmsg'):
+        # Windows has no sendmsg; sendall still avoids re-slicing copies
+        sock.sendall(b''.join(views))
+        return
+    while views:
+        sent = sock.sendmsg(views)
         if sent == 0:
             raise ConnectionError("Socket connection broken")
-        total_sent += sent
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if sent:
+            views[0] = views[0][sent:]
 
 
-def _recv_all(sock: socket.socket, length: int) -> bytes:
-    data = bytearray()
-    while len(data) < length:
-        chunk = sock.recv(length - len(data))
-        if not chunk:
+def _recv_all(sock: socket.socket, view: memoryview) -> None:
+    total = 0
+    length = len(view)
+    while total < length:
+        n = sock.recv_into(view[total:], length - total)
+        if n == 0:
             raise ConnectionError("Socket connection broken")
-        data.extend(chunk)
-    return bytes(data)
+        total += n